@@ -0,0 +1,103 @@
+import os
+import json
+import time
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import typer
+
+from .shared import PAPER_STATE, PANDOC_INPUT_FORMAT
+from .cache import CACHE_DIRECTORY, ensure_cache_dir, hash_bytes
+from .environment import get_tool_version
+
+AST_CACHE_DIRECTORY = os.path.join(CACHE_DIRECTORY, "ast")
+AST_CACHE_MAX_AGE = 60 * 60 * 24 * 14
+
+
+def _get_ast_cache_path(source: bytes) -> str:
+    # the AST depends on the reader settings and the pandoc doing the reading,
+    #   not just the markdown itself
+    key_data = b"\0".join([PANDOC_INPUT_FORMAT.encode("utf-8"), get_tool_version("pandoc").encode("utf-8"), source])
+    return os.path.join(AST_CACHE_DIRECTORY, f"{hash_bytes(key_data)}.json")
+
+
+def _parse_file(path: str) -> str:
+    with open(path, "rb") as source_file:
+        source = source_file.read()
+    cache_path = _get_ast_cache_path(source)
+    if os.path.exists(cache_path):
+        # keeps recently used entries from getting pruned
+        os.utime(cache_path)
+        return cache_path
+
+    if PAPER_STATE["verbose"]:
+        typer.echo(f"Parsing {path}...")
+    # fmt: off
+    cmd = ["pandoc",
+        "--from", PANDOC_INPUT_FORMAT,
+        "--to", "json",
+    ]
+    # fmt: on
+    ast_data = subprocess.check_output(cmd, input=source)
+
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as ast_out:
+        ast_out.write(ast_data)
+    os.replace(tmp_path, cache_path)
+    return cache_path
+
+
+def _merge_documents(docs: list[dict]) -> dict:
+    merged = {
+        "pandoc-api-version": docs[0]["pandoc-api-version"],
+        "meta": {},
+        "blocks": [],
+    }
+    for d in docs:
+        # same as pandoc with multiple inputs: first file to set a field wins
+        for k, v in d["meta"].items():
+            if k not in merged["meta"]:
+                merged["meta"][k] = v
+        merged["blocks"].extend(d["blocks"])
+    return merged
+
+
+def parse_files(input_files: list[str]) -> list[str]:
+    ensure_cache_dir(AST_CACHE_DIRECTORY)
+
+    # cache misses are just pandoc subprocesses, so threads are plenty
+    with ThreadPoolExecutor() as pool:
+        return list(pool.map(_parse_file, input_files))
+
+
+def make_merged_ast(input_files: list[str]) -> str:
+    ast_paths = parse_files(input_files)
+
+    docs = []
+    for ap in ast_paths:
+        with open(ap, "r") as ast_file:
+            docs.append(json.load(ast_file))
+    merged = _merge_documents(docs)
+
+    file_handle, merged_path = tempfile.mkstemp(".json", dir=ensure_cache_dir(), prefix="merged_", text=True)
+    with open(file_handle, "w") as merged_file:
+        json.dump(merged, merged_file)
+
+    _prune_ast_cache(set(ast_paths))
+
+    return merged_path
+
+
+def _prune_ast_cache(keep: set[str]):
+    now = time.time()
+    for f in os.listdir(AST_CACHE_DIRECTORY):
+        path = os.path.join(AST_CACHE_DIRECTORY, f)
+        if path in keep:
+            continue
+        # the other format workers prune at the same time, so an entry can be gone already
+        try:
+            if now - os.path.getmtime(path) > AST_CACHE_MAX_AGE:
+                os.unlink(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,249 @@
+import os
+import json
+import time
+import sqlite3
+import subprocess
+
+import typer
+
+from .shared import PAPER_STATE
+from .cache import ensure_cache_dir, get_user_cache_dir, hash_bytes, hash_file
+from .environment import get_tool_version
+
+# shared by every project, since most of them point at the same big library export
+BIBLIOGRAPHY_CACHE_DIRECTORY = os.path.join(get_user_cache_dir(), "bibliography")
+BIBLIOGRAPHY_DB_NAME = "bibliography.sqlite"
+BIBLIOGRAPHY_CACHE_MAX_AGE = 60 * 60 * 24 * 60
+# per project, unlike the rest of this
+CITED_BIBLIOGRAPHY_NAME = "cited_bibliography.json"
+
+# what pandoc itself would read each kind of file as
+_BIBLIOGRAPHY_READERS = {
+    ".bib": "biblatex",
+    ".bibtex": "bibtex",
+    ".json": "csljson",
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS file_hashes (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sources (
+    source_key TEXT PRIMARY KEY,
+    last_used REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    source_key TEXT NOT NULL,
+    cite_key TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (source_key, cite_key)
+);
+"""
+
+
+def _connect() -> sqlite3.Connection:
+    db_path = os.path.join(ensure_cache_dir(BIBLIOGRAPHY_CACHE_DIRECTORY), BIBLIOGRAPHY_DB_NAME)
+    # several builds (from several projects) can be going at once
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def _get_file_hash(conn: sqlite3.Connection, path: str) -> str:
+    # these exports can run to several megabytes, so only rehash when the file's been touched
+    stat = os.stat(path)
+    row = conn.execute("SELECT size, mtime_ns, hash FROM file_hashes WHERE path = ?", (path,)).fetchone()
+    if row != None and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+        return row[2]
+    file_hash = hash_file(path)
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO file_hashes (path, size, mtime_ns, hash) VALUES (?, ?, ?, ?)",
+            (path, stat.st_size, stat.st_mtime_ns, file_hash),
+        )
+    return file_hash
+
+
+def _read_source(path: str, reader: str) -> list[dict]:
+    if reader == "csljson":
+        with open(path, "r") as source_file:
+            return json.load(source_file)
+    if PAPER_STATE["verbose"]:
+        typer.echo(f"Converting {path} to CSL JSON...")
+    # fmt: off
+    csl_data = subprocess.check_output(["pandoc",
+        "--from", reader,
+        "--to", "csljson",
+        path,
+    ])
+    # fmt: on
+    return json.loads(csl_data)
+
+
+def _index_source(conn: sqlite3.Connection, path: str) -> str | None:
+    reader = _BIBLIOGRAPHY_READERS.get(os.path.splitext(path)[1].lower())
+    if reader == None:
+        return None
+
+    # a converted file also depends on the pandoc that did the converting
+    key_parts = [reader, _get_file_hash(conn, path)]
+    if reader != "csljson":
+        key_parts.append(get_tool_version("pandoc"))
+    source_key = hash_bytes("\0".join(key_parts).encode("utf-8"))
+
+    row = conn.execute("SELECT 1 FROM sources WHERE source_key = ?", (source_key,)).fetchone()
+    if row != None:
+        with conn:
+            conn.execute("UPDATE sources SET last_used = ? WHERE source_key = ?", (time.time(), source_key))
+        return source_key
+
+    try:
+        entries = _read_source(path, reader)
+    except (subprocess.CalledProcessError, json.JSONDecodeError):
+        # let pandoc complain about it in the build proper
+        return None
+    if type(entries) != list:
+        return None
+    with conn:
+        conn.execute("DELETE FROM entries WHERE source_key = ?", (source_key,))
+        conn.executemany(
+            "INSERT OR IGNORE INTO entries (source_key, cite_key, position, data) VALUES (?, ?, ?, ?)",
+            [(source_key, e["id"], i, json.dumps(e)) for i, e in enumerate(entries) if type(e) == dict and "id" in e],
+        )
+        conn.execute("INSERT OR REPLACE INTO sources (source_key, last_used) VALUES (?, ?)", (source_key, time.time()))
+    return source_key
+
+
+def _prune(conn: sqlite3.Connection, keep: set[str]):
+    cutoff = time.time() - BIBLIOGRAPHY_CACHE_MAX_AGE
+    stale = [r[0] for r in conn.execute("SELECT source_key FROM sources WHERE last_used < ?", (cutoff,))]
+    stale = [s for s in stale if s not in keep]
+    if len(stale) == 0:
+        return
+    with conn:
+        for s in stale:
+            conn.execute("DELETE FROM entries WHERE source_key = ?", (s,))
+            conn.execute("DELETE FROM sources WHERE source_key = ?", (s,))
+            # another project's build might have got to it first
+            try:
+                os.unlink(os.path.join(BIBLIOGRAPHY_CACHE_DIRECTORY, f"{s}.json"))
+            except FileNotFoundError:
+                pass
+
+
+def index_bibliography_sources(paths: list[str]) -> dict[str, str | None]:
+    # source path -> key of its entries in the index (None for formats the index doesn't handle)
+    conn = _connect()
+    try:
+        source_keys = {p: _index_source(conn, p) for p in paths}
+        _prune(conn, set([k for k in source_keys.values() if k != None]))
+        return source_keys
+    finally:
+        conn.close()
+
+
+def lookup_bibliography_entries(source_keys: list[str], cite_keys: list[str]) -> dict[str, dict]:
+    # same as pandoc with several bibliographies: the first source with a key wins
+    found = {}
+    conn = _connect()
+    try:
+        for source_key in source_keys:
+            missing = [k for k in cite_keys if k not in found]
+            # stay under SQLite's limit on query parameters
+            for i in range(0, len(missing), 500):
+                batch = missing[i : i + 500]
+                placeholders = ",".join(["?"] * len(batch))
+                rows = conn.execute(
+                    f"SELECT cite_key, data FROM entries WHERE source_key = ? AND cite_key IN ({placeholders})",
+                    [source_key] + batch,
+                )
+                for cite_key, data in rows:
+                    found[cite_key] = json.loads(data)
+    finally:
+        conn.close()
+    return found
+
+
+def get_csl_bibliography_path(path: str, source_key: str | None) -> str:
+    # pandoc reads CSL JSON a good deal faster than BibTeX, so hand it
+    #   the already-converted version of the whole source
+    if source_key == None or _BIBLIOGRAPHY_READERS.get(os.path.splitext(path)[1].lower()) == "csljson":
+        return path
+    export_path = os.path.join(BIBLIOGRAPHY_CACHE_DIRECTORY, f"{source_key}.json")
+    if not os.path.exists(export_path):
+        conn = _connect()
+        try:
+            rows = conn.execute("SELECT data FROM entries WHERE source_key = ? ORDER BY position", (source_key,))
+            entries = [json.loads(r[0]) for r in rows]
+        finally:
+            conn.close()
+        tmp_path = f"{export_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as export_file:
+            json.dump(entries, export_file)
+        os.replace(tmp_path, export_path)
+    return export_path
+
+
+def _collect_cite_keys(doc: dict) -> set[str] | None:
+    # None means the document asks for entries it doesn't cite
+    if "nocite" in doc["meta"]:
+        return None
+    keys = set()
+    stack = [doc["meta"], doc["blocks"]]
+    while len(stack) > 0:
+        node = stack.pop()
+        if type(node) == dict:
+            if node.get("t") == "Cite":
+                keys.update([citation["citationId"] for citation in node["c"][0]])
+            stack.extend(node.values())
+        elif type(node) == list:
+            stack.extend(node)
+    return keys
+
+
+def make_cited_bibliography(ast_paths: list[str], source_keys: dict[str, str | None], meta: dict) -> str | None:
+    # citeproc only needs the entries that actually get cited, and it's a lot
+    #   quicker about it than when handed a whole library; returns None when
+    #   the full sources need to go through after all
+    if len(source_keys) == 0 or None in source_keys.values():
+        return None
+    if "nocite" in meta:
+        return None
+
+    cite_keys = set()
+    for ap in ast_paths:
+        with open(ap, "r") as ast_file:
+            doc_keys = _collect_cite_keys(json.load(ast_file))
+        if doc_keys == None:
+            return None
+        cite_keys.update(doc_keys)
+
+    # biblical citations get turned into plain text by filter-bible-ref, except
+    #   that the first Vulgate one also cites the edition it's using
+    bible_keys = set([k for k in cite_keys if k.startswith("Bible-")])
+    cite_keys -= bible_keys
+    if "Bible-Vulgatam" in bible_keys and meta.get("vulgate_cite_key") != None:
+        cite_keys.add(meta["vulgate_cite_key"])
+
+    cite_keys = sorted(cite_keys)
+    entries = lookup_bibliography_entries(list(source_keys.values()), cite_keys)
+    if len(entries) != len(cite_keys):
+        # let citeproc see everything and warn about whatever's missing
+        if PAPER_STATE["verbose"]:
+            missing = [k for k in cite_keys if k not in entries]
+            typer.echo(f"Couldn't find {', '.join(missing)} in the bibliography; using the full sources.")
+        return None
+
+    if PAPER_STATE["verbose"]:
+        typer.echo(f"Giving citeproc the {len(entries)} cited bibliography entries.")
+    cited_path = os.path.join(ensure_cache_dir(), CITED_BIBLIOGRAPHY_NAME)
+    tmp_path = f"{cited_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as cited_file:
+        json.dump([entries[k] for k in cite_keys], cited_file)
+    os.replace(tmp_path, cited_path)
+    return cited_path
@@ -1,8 +1,8 @@
 import os
-import sys
 import subprocess
 import re
 import json
+from concurrent.futures import ProcessPoolExecutor
 
 import typer
 
@@ -16,41 +16,75 @@ from .util import (
     get_paper_version_stamp,
     get_content_timestamp,
 )
-from .formats import Format, prepare_command, finish_file
-from .shared import PAPER_STATE, PANDOC_INPUT_FORMAT
+from .formats import Format, OUTPUT_SUFFIXES, PDF_VARIANTS, prepare_command, finish_file
+from .shared import PAPER_STATE
+from .ast_cache import parse_files, make_merged_ast
+from .pandoc_server import start_pandoc_server
+from .profiling import profile_stage, take_profile_events, add_profile_events, add_filter_profile, report_profile
+from .bibliography import index_bibliography_sources, get_csl_bibliography_path, make_cited_bibliography
+from .cache import (
+    ensure_cache_dir,
+    hash_bytes,
+    hash_file,
+    list_tree,
+    load_json_cache,
+    save_json_cache,
+)
+from .environment import get_environment_fingerprint, get_tool_version
 
 OUTPUT_DIRECTORY_NAME = "output"
+BUILD_MANIFEST_NAME = "build_manifest.json"
+INTERNAL_FILTER_DIRECTORY = os.path.join(os.path.dirname(__file__), "resources", "filters")
+CITED_REFERENCES_FILTER = os.path.join(INTERNAL_FILTER_DIRECTORY, "cited-references.lua")
+# each runs a whole list of filters in one go; the lists come through the environment
+FILTER_CHAIN_RUNNER = os.path.join(INTERNAL_FILTER_DIRECTORY, "run-filters.lua")
+POST_FILTER_CHAIN_RUNNER = os.path.join(INTERNAL_FILTER_DIRECTORY, "run-post-filters.lua")
 
 
-def build(output_format: Format, docx_revision: int):
+def build(output_formats: list[Format], docx_revision: int, force: bool = False, profile: bool = False):
+    # before any profiling, so there's nowhere for a trace to go unless this is a project
     ensure_paper_dir()
 
-    meta = get_metadata()
+    PAPER_STATE["profile"] = profile
+    try:
+        with profile_stage("build"):
+            _build(output_formats, docx_revision, force)
+    finally:
+        report_profile()
+
 
-    if output_format == None:
+def _build(output_formats: list[Format], docx_revision: int, force: bool):
+    with profile_stage("load metadata"):
+        meta = get_metadata()
+
+    if output_formats == None or len(output_formats) == 0:
         if "default_format" in meta:
-            output_format = meta["default_format"]
+            output_formats = meta["default_format"]
+            if not isinstance(output_formats, list):
+                output_formats = [output_formats]
             all_formats = [f.value for f in Format]
-            if output_format not in all_formats:
-                allf_str = ", ".join([f"'{f}'" for f in all_formats])
-                # stealing this error message format from Click because
-                #   I can't figure out how to directly invoke the validation
-                #   or catch it. :-/
-                # https://github.com/pallets/click/blob/a8910b382d37cce14adeb44a73aca1d4e87c2413/src/click/types.py#L295
-                typer.echo(
-                    f"Error: Invalid value for 'default_format' in metadata: '{output_format}' is not one of {allf_str}."
-                )
-                raise typer.Exit(2)
+            for output_format in output_formats:
+                if output_format not in all_formats:
+                    allf_str = ", ".join([f"'{f}'" for f in all_formats])
+                    # stealing this error message format from Click because
+                    #   I can't figure out how to directly invoke the validation
+                    #   or catch it. :-/
+                    # https://github.com/pallets/click/blob/a8910b382d37cce14adeb44a73aca1d4e87c2413/src/click/types.py#L295
+                    typer.echo(
+                        f"Error: Invalid value for 'default_format' in metadata: '{output_format}' is not one of {allf_str}."
+                    )
+                    raise typer.Exit(2)
         else:
-            output_format = Format.docx
+            output_formats = [Format.docx]
+    output_formats = list(dict.fromkeys([Format(f) for f in output_formats]))
 
-    if "docx" in output_format:
+    if any(["docx" in f for f in output_formats]):
         if "docx" not in PAPER_STATE:
             PAPER_STATE["docx"] = {}
         PAPER_STATE["docx"]["revision"] = docx_revision
 
     if PAPER_STATE["verbose"]:
-        typer.echo(f"Building for format {output_format}")
+        typer.echo(f"Building for format(s) {', '.join([f.value for f in output_formats])}")
 
     content_timestamp = int(get_content_timestamp())
     if PAPER_STATE["verbose"]:
@@ -72,25 +106,118 @@ def build(output_format: Format, docx_revision: int):
         if PAPER_STATE["verbose"]:
             typer.echo(f"No filename given; using generated \"{meta['filename']}\"")
 
+    input_digests = {}
+    with profile_stage("check inputs"):
+        for output_format in output_formats:
+            input_digests[output_format] = _get_input_digest(
+                output_format, meta["filename"], docx_revision, content_timestamp
+            )
+            output_files = _get_output_files(_get_output_filename(meta["filename"], output_format), output_format)
+            if not force and _is_up_to_date(output_format, input_digests[output_format], output_files):
+                typer.echo(
+                    f"Nothing has changed since the last {output_format.value} build; skipping. (Use --force to rebuild.)"
+                )
+                del input_digests[output_format]
+    if len(input_digests) == 0:
+        return
+
+    # the "+pdf" formats produce their base format along the way, so there's
+    #   no need to run (and race) both of them
+    builds = [f for f in input_digests if not (f in PDF_VARIANTS and PDF_VARIANTS[f] in input_digests)]
+
+    # get everything parsed and cached once, up front, so the individual
+    #   format builds just pick up the cached ASTs
+    with profile_stage("parse content"):
+        ast_paths = parse_files(get_content_file_list())
+    with profile_stage("index bibliography"):
+        source_keys = index_bibliography_sources(get_bibliography_source_list())
+    with profile_stage("collect cited entries"):
+        cited_bibliography = make_cited_bibliography(ast_paths, source_keys, meta)
+
+    results = {}
+    build_error = None
+    if len(builds) == 1:
+        results[builds[0]] = _build_format(builds[0], meta["filename"], cited_bibliography)
+    else:
+        if PAPER_STATE.get("pandoc_server", False) and any([f in [Format.latex, Format.latex_pdf] for f in builds]):
+            # started here so the workers share it rather than each starting (and orphaning) their own
+            start_pandoc_server()
+        with ProcessPoolExecutor(
+            max_workers=len(builds), initializer=_init_build_worker, initargs=(dict(PAPER_STATE),)
+        ) as pool:
+            futures = {f: pool.submit(_build_format, f, meta["filename"], cited_bibliography) for f in builds}
+            for output_format, future in futures.items():
+                try:
+                    results[output_format] = future.result()
+                except BaseException as e:
+                    typer.echo(f"Build for format {output_format.value} failed.")
+                    if build_error == None:
+                        build_error = e
+
+    if len(results) > 0:
+        log_lines = []
+        cited_refs_paths = []
+        for lines, cited_refs_path, profile_events in results.values():
+            log_lines.extend(lines)
+            cited_refs_paths.append(cited_refs_path)
+            add_profile_events(profile_events)
+        with profile_stage("record build data"):
+            _record_build_data(log_lines, cited_refs_paths)
+
+        for output_format, input_digest in input_digests.items():
+            if output_format in results or PDF_VARIANTS.get(output_format) in results:
+                output_filename = _get_output_filename(meta["filename"], output_format)
+                _record_build_manifest(output_format, input_digest, _get_output_files(output_filename, output_format))
+
+    if build_error != None:
+        raise build_error
+
+
+def _init_build_worker(paper_state: dict):
+    PAPER_STATE.update(paper_state)
+    # a forked worker starts out with a copy of everything the main process recorded
+    take_profile_events()
+
+
+def _get_output_filename(filename: str, output_format: Format) -> str:
+    return os.path.join(".", OUTPUT_DIRECTORY_NAME, f"{filename}.{OUTPUT_SUFFIXES[output_format]}")
+
+
+def _build_format(
+    output_format: Format, filename: str, cited_bibliography: str | None
+) -> tuple[list[str], str, dict[str, list[dict]]]:
+    with profile_stage(f"format {output_format.value}"):
+        log_lines, cited_refs_path = _run_format_build(output_format, filename, cited_bibliography)
+    # stages from a worker process have to be sent back to get reported
+    return log_lines, cited_refs_path, take_profile_events()
+
+
+def _run_format_build(output_format: Format, filename: str, cited_bibliography: str | None) -> tuple[list[str], str]:
+    # might be in a fresh worker process, without the generated filename
+    meta = get_metadata()
+    meta["filename"] = filename
+
     # fmt: off
     cmd = ["pandoc",
-        "--from", PANDOC_INPUT_FORMAT,
+        "--from", "json",
         "--metadata-file", "./paper_meta.yml",
         "--resource-path", "./content",
     ]
     # fmt: on
 
-    output_suffix, tmp_prefix_files, tmp_suffix_files = prepare_command(cmd, output_format)
+    with profile_stage("prepare_command"):
+        tmp_prefix_files, tmp_suffix_files = prepare_command(cmd, output_format)
 
-    output_filename = os.path.join(".", OUTPUT_DIRECTORY_NAME, f"{meta['filename']}.{output_suffix}")
+    output_filename = _get_output_filename(filename, output_format)
     cmd.extend(["--output", output_filename])
 
+    pandoc_env = dict(os.environ)
+
     filter_dir = os.path.join(".", ".paper_resources", "filters")
-    filters = [f for f in os.listdir(filter_dir) if f.startswith("filter-")]
-    filter_cmds = [
-        "--lua-filter" if not toggle else os.path.join(filter_dir, f) for f in filters for toggle in range(2)
-    ]
-    cmd.extend(filter_cmds)
+    filters = sorted([os.path.join(filter_dir, f) for f in os.listdir(filter_dir) if f.startswith("filter-")])
+    if len(filters) > 0:
+        cmd.extend(["--lua-filter", FILTER_CHAIN_RUNNER])
+        pandoc_env["PAPER_FILTERS"] = os.pathsep.join(filters)
 
     bib_paths = get_bibliography_source_list()
 
@@ -102,13 +229,21 @@ def build(output_format: Format, docx_revision: int):
             cmd.extend(["--csl", "./.paper_resources/chicago-fullnote-bibliography-short-title-subsequent.csl"])
         else:
             cmd.extend(["--csl", "./.paper_resources/chicago-fullnote-bibliography-with-ibid.csl"])
-        cmd.extend(["--bibliography" if not toggle else bp for bp in bib_paths for toggle in range(2)])
+        if cited_bibliography != None:
+            cmd.extend(["--bibliography", cited_bibliography])
+        else:
+            # already indexed up front, so this is just a lookup
+            source_keys = index_bibliography_sources(bib_paths)
+            for bp in bib_paths:
+                cmd.extend(["--bibliography", get_csl_bibliography_path(bp, source_keys[bp])])
 
-        post_filters = [f for f in os.listdir(filter_dir) if f.startswith("post-filter-")]
-        post_filter_cmds = [
-            "--lua-filter" if not toggle else os.path.join(filter_dir, f) for f in post_filters for toggle in range(2)
-        ]
-        cmd.extend(post_filter_cmds)
+        post_filters = sorted(
+            [os.path.join(filter_dir, f) for f in os.listdir(filter_dir) if f.startswith("post-filter-")]
+        )
+        # last of all, note which references got used so the build data can record them
+        post_filters.append(CITED_REFERENCES_FILTER)
+        cmd.extend(["--lua-filter", POST_FILTER_CHAIN_RUNNER])
+        pandoc_env["PAPER_POST_FILTERS"] = os.pathsep.join(post_filters)
     else:
         if PAPER_STATE["verbose"]:
             typer.echo("No citation processing.")
@@ -117,14 +252,34 @@ def build(output_format: Format, docx_revision: int):
     input_file_list.extend(tmp_prefix_files)
     input_file_list.extend(get_content_file_list())
     input_file_list.extend(tmp_suffix_files)
-    cmd.extend(input_file_list)
+    # each file gets parsed (or pulled from the cache) on its own,
+    #   then everything downstream works from the combined AST
+    with profile_stage("merge content"):
+        merged_ast_path = make_merged_ast(input_file_list)
+    cmd.append(merged_ast_path)
+
+    cited_refs_path = os.path.join(ensure_cache_dir(), f"cited_references_{output_format.name}.json")
+    if os.path.exists(cited_refs_path):
+        os.unlink(cited_refs_path)
+    pandoc_env["PAPER_CITED_REFERENCES_PATH"] = os.path.abspath(cited_refs_path)
+
+    filter_profile_path = None
+    if PAPER_STATE.get("profile", False):
+        filter_profile_path = os.path.join(ensure_cache_dir(), f"filter_profile_{output_format.name}.tsv")
+        if os.path.exists(filter_profile_path):
+            os.unlink(filter_profile_path)
+        pandoc_env["PAPER_FILTER_PROFILE_PATH"] = os.path.abspath(filter_profile_path)
 
     if PAPER_STATE["verbose"]:
         typer.echo("Invoking pandoc:")
         typer.echo(f"\t{' '.join(cmd)}")
-    subprocess.check_call(cmd)
+    with profile_stage(f"pandoc ({output_format.value})"):
+        subprocess.check_call(cmd, env=pandoc_env)
+    if filter_profile_path != None:
+        add_filter_profile(f"pandoc ({output_format.value})", filter_profile_path)
 
-    log_lines = finish_file(output_filename, output_format)
+    with profile_stage("finish_file"):
+        log_lines = finish_file(output_filename, output_format)
 
     if PAPER_STATE["verbose"]:
         typer.echo("Cleaning up temp files...")
@@ -132,52 +287,93 @@ def build(output_format: Format, docx_revision: int):
         os.unlink(f)
     for f in tmp_suffix_files:
         os.unlink(f)
-
-    _record_build_data(log_lines)
-
-
-def _record_build_data(log_lines: list[str]):
+    os.unlink(merged_ast_path)
+
+    return log_lines, cited_refs_path
+
+
+def _get_output_files(output_filename: str, output_format: Format) -> list[str]:
+    output_files = [output_filename]
+    if output_format in [Format.docx_pdf, Format.latex_pdf]:
+        output_files.append(f"{os.path.splitext(output_filename)[0]}.pdf")
+    return output_files
+
+
+def _get_input_digest(output_format: Format, filename: str, docx_revision: int, content_timestamp: int) -> str:
+    # everything that can change the bytes of the output; if none of it
+    #   has moved since the last build, there's no point in running again
+    inputs = {
+        "paper_version": get_paper_version_stamp(),
+        "format": output_format.value,
+        # can come from the directory name, so it can change without any file changing
+        "filename": filename,
+        "source_date_epoch": content_timestamp,
+        "pandoc": get_tool_version("pandoc"),
+        "files": {},
+    }
+    if output_format == Format.latex_pdf:
+        inputs["xelatex"] = get_tool_version("xelatex")
+    if output_format in [Format.docx, Format.docx_pdf]:
+        if docx_revision <= 0:
+            # the revision number gets derived from the commit count at packaging time
+            inputs["docx_revision"] = (
+                subprocess.check_output(["git", "rev-list", "--all", "--count"]).decode("utf-8").strip()
+            )
+        else:
+            inputs["docx_revision"] = docx_revision
+
+    input_files = ["./paper_meta.yml"]
+    input_files.extend(list_tree("./content"))
+    input_files.extend(list_tree("./.paper_resources"))
+    input_files.extend(list_tree(os.path.join(os.path.dirname(__file__), "resources", "filters")))
+    input_files.extend(get_bibliography_source_list())
+    for f in input_files:
+        inputs["files"][f] = hash_file(f)
+
+    return hash_bytes(json.dumps(inputs, sort_keys=True).encode("utf-8"))
+
+
+def _is_up_to_date(output_format: Format, input_digest: str, output_files: list[str]) -> bool:
+    manifest = load_json_cache(BUILD_MANIFEST_NAME, {})
+    entry = manifest.get(output_format.value)
+    if entry == None or entry["digest"] != input_digest:
+        return False
+    # and be where this build would put them
+    if any([f not in entry["outputs"] for f in output_files]):
+        return False
+    # the outputs also have to still be the ones we made (another format
+    #   might have overwritten them, or they might have been deleted)
+    for path, output_hash in entry["outputs"].items():
+        if not os.path.exists(path) or hash_file(path) != output_hash:
+            return False
+    return True
+
+
+def _record_build_manifest(output_format: Format, input_digest: str, output_files: list[str]):
+    manifest = load_json_cache(BUILD_MANIFEST_NAME, {})
+    manifest[output_format.value] = {
+        "digest": input_digest,
+        "outputs": {path: hash_file(path) for path in output_files if os.path.exists(path)},
+    }
+    save_json_cache(BUILD_MANIFEST_NAME, manifest)
+
+
+def _record_build_data(log_lines: list[str], cited_refs_paths: list[str]):
     # paper version record
     stamp_local_dir()
 
-    # record data on cited references
-    bib_paths = get_bibliography_source_list()
-    if len(bib_paths) > 0:
-        cited_reference_keys = []
-        refs = []
-        with open(os.devnull, "wb") as dev_null:
-            # fmt: off
-            cmd = ["pandoc",
-                "--to", os.path.join(os.path.dirname(__file__), "resources", "writers", "ref_list.lua"),
-                "--metadata-file", "./paper_meta.yml",
-                "--citeproc"
-            ]
-            # fmt: on
-            cmd.extend(["--bibliography" if not toggle else bp for bp in bib_paths for toggle in range(2)])
-            cmd.extend(get_content_file_list())
-            ref_str = subprocess.check_output(cmd, stderr=dev_null).decode("utf-8").strip()
-            cited_reference_keys.extend(ref_str.splitlines())
-
-            # gotta do one-by-one because a .json file will get assumed as a dumped AST;
-            #   others will get autodetected
-            for ref_list in bib_paths:
-                # fmt: off
-                cmd = ["pandoc",
-                    "--to", "csljson",
-                ]
-                # fmt: on
-                if ref_list.endswith(".json"):
-                    cmd.extend(["--from", "csljson"])
-                cmd.append(ref_list)
-                source_data_text = subprocess.check_output(cmd, stderr=dev_null)
-                source_data = json.loads(source_data_text)
-                for entry in source_data:
-                    if entry["id"] in cited_reference_keys:
-                        refs.append(entry)
-
-        if len(refs) > 0:
-            with open(os.path.join(".paper_data", "cited_references.json"), "w") as refs_out:
-                json.dump(refs, refs_out, indent="  ")
+    # record data on cited references (gathered by the filter at the end of the main pandoc pass;
+    #   every format cites the same things, so whichever one finished is good enough)
+    refs = None
+    for cited_refs_path in cited_refs_paths:
+        if os.path.exists(cited_refs_path):
+            if refs == None:
+                with open(cited_refs_path, "r") as refs_file:
+                    refs = json.load(refs_file)
+            os.unlink(cited_refs_path)
+    if refs != None and len(refs) > 0:
+        with open(os.path.join(".paper_data", "cited_references.json"), "w") as refs_out:
+            json.dump(refs, refs_out, indent="  ")
 
     with open(os.path.join(".paper_data", "build_environment.txt"), "w") as build_out:
         separator = f"{'#' * 60}"
@@ -187,11 +383,7 @@ def _record_build_data(log_lines: list[str]):
         build_out.write(f"\n{separator}\n")
 
         # python libraries
-        python_reqs = (
-            subprocess.check_output([sys.executable, "-m", "pip", "freeze", "--local"]).decode("utf-8").splitlines()
-        )
-        python_reqs = [r for r in python_reqs if not r.startswith("-e ")]
-        build_out.write("\n".join(python_reqs))
+        build_out.write("\n".join(get_environment_fingerprint()["python_packages"]))
         build_out.write(f"\n{separator}\n")
 
         # format-specific stuff, if needed
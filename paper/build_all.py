@@ -0,0 +1,109 @@
+import os
+import sys
+import time
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import typer
+
+from .formats import Format
+from .shared import PAPER_STATE
+
+# last lines of a failed build's output to show in the summary
+FAILURE_TAIL_LINES = 10
+
+
+def find_projects(root: str) -> list[str]:
+    # same things ensure_paper_dir looks for; no looking for projects inside projects
+    projects = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        if (
+            "paper_meta.yml" in filenames
+            and os.path.isdir(os.path.join(dirpath, "content"))
+            and os.path.isdir(os.path.join(dirpath, ".paper_resources"))
+        ):
+            projects.append(dirpath)
+            dirnames[:] = []
+        else:
+            dirnames[:] = sorted([d for d in dirnames if not d.startswith(".")])
+    return sorted(projects)
+
+
+def _build_project(project_dir: str, output_formats: list[Format], docx_revision: int, force: bool) -> dict:
+    # each build gets its own process, since everything in a build works
+    #   relative to the current directory; the user-level caches
+    #   (bibliography index, LaTeX formats) are shared between them all, which
+    #   works since their writes are write-and-rename and their pruning skips
+    #   whatever another build already removed
+    cmd = [sys.executable, "-m", "paper"]
+    if PAPER_STATE["verbose"]:
+        cmd.append("--verbose")
+    if PAPER_STATE.get("pandoc_server", False):
+        cmd.append("--pandoc-server")
+    cmd.append("build")
+    for f in output_formats:
+        cmd.extend(["--output-format", f.value])
+    cmd.extend(["--docx-revision", str(docx_revision)])
+    if force:
+        cmd.append("--force")
+
+    start = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=project_dir, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    return {
+        "ok": proc.returncode == 0,
+        "seconds": time.perf_counter() - start,
+        "output": proc.stdout.decode("utf-8", errors="replace"),
+    }
+
+
+def build_all(root: str, output_formats: list[Format], docx_revision: int, force: bool, jobs: int | None):
+    if not os.path.isdir(root):
+        typer.echo(f"Not a directory: '{root}'")
+        raise typer.Exit(1)
+    projects = find_projects(root)
+    if len(projects) == 0:
+        typer.echo(f"No paper projects found under '{root}'.")
+        raise typer.Exit(1)
+
+    if jobs == None:
+        jobs = os.cpu_count() or 1
+    jobs = max(min(jobs, len(projects)), 1)
+    typer.echo(f"Building {len(projects)} project(s), {jobs} at a time...")
+
+    start = time.perf_counter()
+    results = {}
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(_build_project, p, output_formats, docx_revision, force): p for p in projects}
+        for future in as_completed(futures):
+            project_dir = futures[future]
+            name = os.path.relpath(project_dir, root)
+            result = future.result()
+            results[project_dir] = result
+            status = "done" if result["ok"] else "FAILED"
+            typer.echo(f"[{len(results)}/{len(projects)}] {name}: {status} ({result['seconds']:.1f}s)")
+            if PAPER_STATE["verbose"]:
+                # held until the build finishes so parallel builds don't interleave
+                typer.echo(result["output"].rstrip())
+    elapsed = time.perf_counter() - start
+
+    names = [os.path.relpath(p, root) for p in projects]
+    width = max([len(n) for n in names] + [len("Project")])
+    typer.echo()
+    typer.echo(f"{'Project':<{width}}  Result  Time (s)")
+    typer.echo(f"{'-' * width}  ------  --------")
+    for project_dir, name in zip(projects, names):
+        result = results[project_dir]
+        typer.echo(f"{name:<{width}}  {'ok' if result['ok'] else 'FAILED':<6}  {result['seconds']:>8.1f}")
+
+    failures = [p for p in projects if not results[p]["ok"]]
+    typer.echo()
+    typer.echo(f"{len(projects) - len(failures)} succeeded, {len(failures)} failed, {elapsed:.1f}s total.")
+
+    if len(failures) > 0:
+        if not PAPER_STATE["verbose"]:
+            for project_dir in failures:
+                typer.echo()
+                typer.echo(f"{os.path.relpath(project_dir, root)}:")
+                for line in results[project_dir]["output"].rstrip().splitlines()[-FAILURE_TAIL_LINES:]:
+                    typer.echo(f"    {line}")
+        raise typer.Exit(1)
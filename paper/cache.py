@@ -0,0 +1,76 @@
+import os
+import json
+import hashlib
+
+PAPER_DATA_DIRECTORY = ".paper_data"
+CACHE_DIRECTORY = os.path.join(PAPER_DATA_DIRECTORY, "cache")
+
+
+def ignore_in_git(directory: str, pattern: str):
+    # projects made before these files existed don't have them in their
+    #   .gitignore, and `paper save` adds everything
+    ignore_path = os.path.join(directory, ".gitignore")
+    if os.path.exists(ignore_path):
+        with open(ignore_path, "r") as ignore_file:
+            if pattern in ignore_file.read().splitlines():
+                return
+    with open(ignore_path, "a") as ignore_file:
+        ignore_file.write(f"{pattern}\n")
+
+
+def ensure_cache_dir(directory: str = CACHE_DIRECTORY) -> str:
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    # the project cache ignores itself (.gitignore included), subdirectories and all
+    cache_root = os.path.abspath(CACHE_DIRECTORY)
+    if os.path.commonpath([cache_root, os.path.abspath(directory)]) == cache_root:
+        ignore_in_git(CACHE_DIRECTORY, "*")
+    return directory
+
+
+def get_user_cache_dir() -> str:
+    # for things that are about the machine rather than the project
+    cache_home = os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache"))
+    return os.path.join(cache_home, "paper")
+
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def list_tree(root: str) -> list[str]:
+    # follows symlinks so a `paper dev` project still picks up the real resources
+    file_list = []
+    for dirpath, _, files in os.walk(root, followlinks=True):
+        file_list.extend([os.path.join(dirpath, f) for f in files if not f.startswith(".")])
+    file_list.sort()
+    return file_list
+
+
+def load_json_cache(name: str, default=None, directory: str = CACHE_DIRECTORY):
+    path = os.path.join(directory, name)
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path, "r") as cache_file:
+            return json.load(cache_file)
+    except (OSError, json.JSONDecodeError):
+        # a corrupt cache is just a cold cache
+        return default
+
+
+def save_json_cache(name: str, data, directory: str = CACHE_DIRECTORY):
+    path = os.path.join(ensure_cache_dir(directory), name)
+    # write-and-rename so a crashed (or concurrent) build never leaves half a file behind
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as cache_file:
+        json.dump(data, cache_file)
+    os.replace(tmp_path, path)
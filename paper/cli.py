@@ -42,6 +42,9 @@ def paper(
         None, "--version", is_eager=True, help="Print version information for paper and exit."
     ),
     verbose: Optional[bool] = typer.Option(None, "-v", "--verbose", help="Spam the output log."),
+    pandoc_server: bool = typer.Option(
+        False, "--pandoc-server", help="Run simple pandoc conversions through one long-lived `pandoc server`."
+    ),
 ):
     """\b
     Shane’s little paper-{writing|managing|building} utility
@@ -57,6 +60,7 @@ def paper(
             raise typer.Exit(0)
     else:
         PAPER_STATE["verbose"] = False
+    PAPER_STATE["pandoc_server"] = pandoc_server
 
 
 @_app.command()
@@ -93,23 +97,64 @@ def dev():
 
 
 @_app.command()
-def build(output_format: Format = typer.Option(None), docx_revision: int = -1):
+def build(
+    output_format: Optional[list[Format]] = typer.Option(None),
+    docx_revision: int = -1,
+    force: bool = False,
+    profile: bool = typer.Option(False, help="Time each stage of the build and write a trace to `.paper_data`."),
+):
     """
     Generate versions of the paper ready for submission.
+    Give `--output-format` more than once to build several formats in parallel.
+    Skips the build if no inputs have changed since the last one, unless `--force` is given.
     """
     from .build import build
 
-    build(output_format, docx_revision)
+    build(output_format, docx_revision, force, profile)
+
+
+@_app.command()
+def build_all(
+    root: str = typer.Argument(".", help="Directory to search for paper projects."),
+    output_format: Optional[list[Format]] = typer.Option(None),
+    docx_revision: int = -1,
+    force: bool = False,
+    jobs: Optional[int] = typer.Option(None, "--jobs", "-j", help="How many projects to build at once."),
+):
+    """
+    Build every paper project found under a directory, several at a time.
+    Takes the same format options as `build`, and prints a summary at the end.
+    """
+    from .build_all import build_all
+
+    build_all(root, output_format, docx_revision, force, jobs)
+
+
+@_app.command()
+def watch(output_format: Optional[list[Format]] = typer.Option(None), docx_revision: int = -1):
+    """
+    Rebuild whenever the content, metadata, resources, or bibliography sources change.
+    Takes the same format options as `build`.
+    """
+    from .watch import watch
+
+    watch(output_format, docx_revision)
 
 
 @_app.command()
-def fmt(wrap: bool = True, columns: int = 80):
+def fmt(
+    wrap: bool = True,
+    columns: int = 80,
+    jobs: Optional[int] = typer.Option(None, "--jobs", "-j", help="How many files to format at once."),
+    check: bool = typer.Option(False, help="Only list the files that would change; exit with an error if any would."),
+):
     """
     Run an automated formatter on all the local Markdown files.
+    Files that haven't changed since they were last formatted with the same settings are skipped.
     """
     from .mdfmt import fmt
 
-    fmt(wrap, columns)
+    fmt(wrap, columns, jobs, check)
 
 
 @_app.command()
@@ -1,21 +1,23 @@
 import os
+import re
+import time
 import shutil
 import subprocess
 from datetime import datetime
 import zipfile
 import tempfile
+from typing import Callable
+from xml.sax.saxutils import escape
 
 import typer
-from docx import Document
-from docx import enum
-from docx.shared import Pt
-from docx.oxml.ns import qn
 from PyPDF2 import PdfFileReader, PdfFileWriter
 
 from . import LIB_NAME, LIB_VERSION_STR
 from .shared import PAPER_STATE
 from .util import get_date_string
 
+PRECOMPRESSED_EXTENSIONS = [".jpg", ".jpeg", ".png", ".gif", ".wdp"]
+
 
 def generate_title_page_string(meta: dict):
     title_string = "::: title-page\n\n"
@@ -61,58 +63,137 @@ def generate_title_page_string(meta: dict):
 def package(filename: str, meta: dict):
     if PAPER_STATE["verbose"]:
         typer.echo("Packaging docx...")
-    doc = Document(filename)
+
+    # Everything here is a small, targeted edit to one of three parts of the
+    #   package, so rather than loading the whole document into a DOM, patch
+    #   the XML text directly as the archive gets rewritten.
+    part_patches = {}
 
     # change fonts if we were asked to
+    style_fonts = {}
     if "base_font_override" in meta and meta["base_font_override"] != None:
         if PAPER_STATE["verbose"]:
             typer.echo(f"Changing base font to {meta['base_font_override']}...")
-        doc.styles["Normal"].font.name = meta["base_font_override"]
+        style_fonts["Normal"] = meta["base_font_override"]
     if "mono_font_override" in meta and meta["mono_font_override"] != None:
         if PAPER_STATE["verbose"]:
             typer.echo(f"Changing mono font to {meta['mono_font_override']}...")
-        doc.styles["Verbatim Char"].font.name = meta["mono_font_override"]
+        style_fonts["Verbatim Char"] = meta["mono_font_override"]
+    if len(style_fonts) > 0:
+        part_patches["word/styles.xml"] = lambda xml: _patch_style_fonts(xml, style_fonts)
 
     # set metadata
     if PAPER_STATE["verbose"]:
         typer.echo("Fixing docx metadata...")
-    doc.core_properties.title = meta["data"]["title"]
-    doc.core_properties.author = meta["data"]["author"]
-    doc.core_properties.last_modified_by = meta["data"]["author"]
     if PAPER_STATE["docx"]["revision"] <= 0:
-        doc.core_properties.revision = max(1, int(subprocess.check_output(["git", "rev-list", "--all", "--count"])) - 1)
+        revision = max(1, int(subprocess.check_output(["git", "rev-list", "--all", "--count"])) - 1)
     else:
-        doc.core_properties.revision = int(PAPER_STATE["docx"]["revision"])
+        revision = int(PAPER_STATE["docx"]["revision"])
+    core_properties = {
+        "dc:title": meta["data"]["title"],
+        "dc:creator": meta["data"]["author"],
+        "cp:lastModifiedBy": meta["data"]["author"],
+        "cp:revision": str(revision),
+    }
+    part_patches["docProps/core.xml"] = lambda xml: _patch_core_properties(xml, core_properties)
 
     # check "Total Row" box on tables
-    if len(doc.tables) > 0:
-        if PAPER_STATE["verbose"]:
-            typer.echo("Fixing table formatting...")
-    for t in doc.tables:
-        tblLook = t._tblPr.first_child_found_in("w:tblLook")
-        tblLook.set(qn("w:lastRow"), "1")
-
-    if PAPER_STATE["verbose"]:
-        typer.echo(f"Writing final docx to {filename}...")
-    doc.save(filename)
+    part_patches["word/document.xml"] = _patch_table_looks
 
+    date_time = None
     if "SOURCE_DATE_EPOCH" in os.environ:
         if PAPER_STATE["verbose"]:
             typer.echo(f"Correcting interior timestamps on {filename}...")
+        # zip timestamps are local time, and can't go back before 1980
+        date_time = max(time.localtime(float(os.environ["SOURCE_DATE_EPOCH"]))[:6], (1980, 1, 1, 0, 0, 0))
 
-        epoch = float(os.environ["SOURCE_DATE_EPOCH"])
-        with tempfile.TemporaryDirectory() as tmpdir:
-            zf = zipfile.ZipFile(filename)
-            zf.extractall(tmpdir)
-            zf.close()
-            os.unlink(filename)
-            nzf = zipfile.ZipFile(filename, "w", compression=zipfile.ZIP_DEFLATED)
-            for dirpath, _, files in os.walk(tmpdir):
-                for f in files:
-                    fpath = os.path.join(dirpath, f)
-                    os.utime(fpath, (epoch, epoch))
-                    nzf.write(fpath, fpath[len(tmpdir) :])
-            nzf.close()
+    if PAPER_STATE["verbose"]:
+        typer.echo(f"Writing final docx to {filename}...")
+    _rewrite_docx(filename, part_patches, date_time)
+
+
+def _set_xml_attribute(tag: str, attr: str, value: str) -> str:
+    # `tag` is the full text of a single start (or empty-element) tag
+    attr_text = f' {attr}="{escape(value, {chr(34): "&quot;"})}"'
+    attr_re = re.compile(rf'\s{re.escape(attr)}="[^"]*"')
+    if attr_re.search(tag):
+        return attr_re.sub(lambda _: attr_text, tag, count=1)
+    tag_end = len(tag) - 2 if tag.endswith("/>") else len(tag) - 1
+    return f"{tag[:tag_end]}{attr_text}{tag[tag_end:]}"
+
+
+def _patch_core_properties(xml: str, properties: dict[str, str]) -> str:
+    for tag, value in properties.items():
+        element = f"<{tag}>{escape(value)}</{tag}>"
+        element_re = re.compile(rf"<{tag}(\s[^>]*)?(/>|>.*?</{tag}>)", re.DOTALL)
+        if element_re.search(xml):
+            xml = element_re.sub(lambda _: element, xml, count=1)
+        else:
+            xml = xml.replace("</cp:coreProperties>", f"{element}</cp:coreProperties>")
+    return xml
+
+
+def _patch_style_fonts(xml: str, style_fonts: dict[str, str]) -> str:
+    def patch_style(match: re.Match) -> str:
+        style = match.group(0)
+        name_match = re.search(r'<w:name w:val="([^"]*)"\s*/>', style)
+        if name_match == None or name_match.group(1) not in style_fonts:
+            return style
+        font = style_fonts[name_match.group(1)]
+
+        # same as python-docx's `font.name`: the ASCII and high-ANSI slots
+        rfonts_re = re.compile(r"<w:rFonts\b[^>]*>")
+        if rfonts_re.search(style):
+            return rfonts_re.sub(
+                lambda f: _set_xml_attribute(_set_xml_attribute(f.group(0), "w:ascii", font), "w:hAnsi", font),
+                style,
+                count=1,
+            )
+        rfonts = _set_xml_attribute(_set_xml_attribute("<w:rFonts/>", "w:ascii", font), "w:hAnsi", font)
+        if "<w:rPr>" in style:
+            return style.replace("<w:rPr>", f"<w:rPr>{rfonts}", 1)
+        if "<w:rPr/>" in style:
+            return style.replace("<w:rPr/>", f"<w:rPr>{rfonts}</w:rPr>", 1)
+        return style.replace("</w:style>", f"<w:rPr>{rfonts}</w:rPr></w:style>")
+
+    return re.sub(r"<w:style\b[^>]*>.*?</w:style>", patch_style, xml, flags=re.DOTALL)
+
+
+def _patch_table_looks(xml: str) -> str:
+    xml, table_count = re.subn(r"<w:tblLook\b[^>]*>", lambda t: _set_xml_attribute(t.group(0), "w:lastRow", "1"), xml)
+    if table_count > 0 and PAPER_STATE["verbose"]:
+        typer.echo("Fixing table formatting...")
+    return xml
+
+
+def _rewrite_docx(filename: str, part_patches: dict[str, Callable[[str], str]], date_time: tuple | None):
+    # one pass, entry by entry, into a new archive next to the old one
+    file_handle, tmp_filename = tempfile.mkstemp(".docx", dir=os.path.dirname(os.path.abspath(filename)))
+    os.close(file_handle)
+    try:
+        with zipfile.ZipFile(filename) as src, zipfile.ZipFile(tmp_filename, "w") as dst:
+            for info in src.infolist():
+                new_info = zipfile.ZipInfo(info.filename, date_time if date_time != None else info.date_time)
+                new_info.external_attr = info.external_attr
+                if os.path.splitext(info.filename)[1].lower() in PRECOMPRESSED_EXTENSIONS:
+                    # deflating a JPEG again just burns time for no gain
+                    new_info.compress_type = zipfile.ZIP_STORED
+                else:
+                    new_info.compress_type = zipfile.ZIP_DEFLATED
+
+                if info.filename in part_patches:
+                    part_xml = src.read(info).decode("utf-8")
+                    dst.writestr(new_info, part_patches[info.filename](part_xml).encode("utf-8"))
+                else:
+                    new_info.file_size = info.file_size
+                    with src.open(info) as entry_in, dst.open(new_info, "w") as entry_out:
+                        shutil.copyfileobj(entry_in, entry_out)
+        # mkstemp makes it private; keep whatever the original was
+        shutil.copymode(filename, tmp_filename)
+        os.replace(tmp_filename, filename)
+    finally:
+        if os.path.exists(tmp_filename):
+            os.unlink(tmp_filename)
 
 
 def make_pdf(filename: str, meta: dict):
@@ -0,0 +1,108 @@
+import os
+import sys
+import site
+import json
+import shutil
+import subprocess
+import importlib.metadata
+
+from .cache import get_user_cache_dir, load_json_cache, save_json_cache
+
+ENVIRONMENT_CACHE_NAME = "environment.json"
+ENVIRONMENT_TOOLS = ["pandoc", "xelatex"]
+# same as what `pip freeze` leaves out by default
+_FREEZE_EXCLUDES = ["pip", "setuptools", "wheel", "distribute"]
+
+_fingerprint = None
+
+
+def _get_mtime(path: str | None) -> float | None:
+    if path == None:
+        return None
+    try:
+        return os.stat(os.path.realpath(path)).st_mtime
+    except OSError:
+        return None
+
+
+def _get_tool_key(tool: str) -> list | None:
+    # a different copy of a tool (another venv, a PATH change) can easily share an mtime
+    path = shutil.which(tool)
+    if path == None:
+        return None
+    return [os.path.realpath(path), _get_mtime(path)]
+
+
+def _get_environment_key() -> dict:
+    # Cheap to check (just stats), and changes whenever something that goes
+    #   into the fingerprint could have: a different interpreter, packages
+    #   installed or removed, or a tool upgraded.
+    site_dirs = site.getsitepackages()
+    if site.ENABLE_USER_SITE:
+        site_dirs.append(site.getusersitepackages())
+    return {
+        "executable": sys.executable,
+        "python": sys.version,
+        "site_packages": {d: _get_mtime(d) for d in site_dirs},
+        "tools": {t: _get_tool_key(t) for t in ENVIRONMENT_TOOLS},
+    }
+
+
+def _is_editable(dist: importlib.metadata.Distribution) -> bool:
+    direct_url = dist.read_text("direct_url.json")
+    if direct_url == None:
+        return False
+    try:
+        return json.loads(direct_url).get("dir_info", {}).get("editable", False)
+    except json.JSONDecodeError:
+        return False
+
+
+def _get_python_packages() -> list[str]:
+    in_venv = sys.prefix != sys.base_prefix
+    packages = {}
+    for dist in importlib.metadata.distributions():
+        name = dist.metadata["Name"]
+        if name == None or name.lower() in _FREEZE_EXCLUDES:
+            continue
+        # like `pip freeze --local`, skip editable installs and anything outside the virtualenv
+        if _is_editable(dist):
+            continue
+        if in_venv and not os.path.realpath(str(dist.locate_file(""))).startswith(os.path.realpath(sys.prefix)):
+            continue
+        packages[name.lower()] = f"{name}=={dist.version}"
+    return [packages[k] for k in sorted(packages)]
+
+
+def _get_tool_version_uncached(tool: str) -> str:
+    try:
+        version = subprocess.check_output([tool, "--version"], stderr=subprocess.DEVNULL)
+        return version.decode("utf-8").strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def get_environment_fingerprint() -> dict:
+    global _fingerprint
+    if _fingerprint != None:
+        return _fingerprint
+
+    key = _get_environment_key()
+    cached = load_json_cache(ENVIRONMENT_CACHE_NAME, None, get_user_cache_dir())
+    if cached != None and cached["key"] == key:
+        _fingerprint = cached["fingerprint"]
+        return _fingerprint
+
+    _fingerprint = {
+        "python_packages": _get_python_packages(),
+        "tools": {t: _get_tool_version_uncached(t) for t in ENVIRONMENT_TOOLS},
+    }
+    save_json_cache(ENVIRONMENT_CACHE_NAME, {"key": key, "fingerprint": _fingerprint}, get_user_cache_dir())
+    return _fingerprint
+
+
+def get_tool_version(tool: str) -> str:
+    tools = get_environment_fingerprint()["tools"]
+    if tool not in tools:
+        tools[tool] = _get_tool_version_uncached(tool)
+    return tools[tool]
@@ -5,14 +5,27 @@ import tempfile
 import subprocess
 import shutil
 import json
+import re
 
 import typer
 
 from . import LIB_NAME, LIB_VERSION_STR
 from .shared import PAPER_STATE, PANDOC_INPUT_FORMAT
 from .util import get_metadata, get_date_string
+from .cache import CACHE_DIRECTORY, ensure_cache_dir, hash_bytes, hash_file, load_json_cache, save_json_cache
+from .environment import get_tool_version
+from .pandoc_server import convert
+from .profiling import profile_stage
+from .latex_format import get_precompiled_preamble, get_precompiled_packages, discard_precompiled_preamble
 from .doc_handling import make_pdf, package, generate_title_page_string
 
+LATEX_MARKUP_CACHE_NAME = "latex_markup.json"
+LATEX_MARKUP_SEPARATOR = "PAPERMETADATASEPARATOR"
+LATEX_AUX_DIRECTORY = os.path.join(CACHE_DIRECTORY, "latex")
+LATEX_MAX_RUNS = 5
+# outputs of a run, rather than inputs to the next one
+LATEX_NON_AUX_EXTENSIONS = [".pdf", ".log", ".xdv", ".synctex", ".gz"]
+
 
 class Format(str, enum.Enum):
     docx = "docx"
@@ -22,7 +35,22 @@ class Format(str, enum.Enum):
     json = "json"
 
 
-def prepare_command(cmd: list[str], f: Format) -> tuple[str, list[str], list[str]]:
+OUTPUT_SUFFIXES = {
+    Format.docx: "docx",
+    Format.docx_pdf: "docx",
+    Format.latex: "tex",
+    Format.latex_pdf: "tex",
+    Format.json: "json",
+}
+
+# the formats that also get produced as a side effect of building a PDF
+PDF_VARIANTS = {
+    Format.docx: Format.docx_pdf,
+    Format.latex: Format.latex_pdf,
+}
+
+
+def prepare_command(cmd: list[str], f: Format) -> tuple[list[str], list[str]]:
     meta = get_metadata()
 
     if f in [Format.docx, Format.docx_pdf]:
@@ -42,7 +70,7 @@ def prepare_command(cmd: list[str], f: Format) -> tuple[str, list[str], list[str
             with open(file_handle, "w") as title_page_file:
                 title_page_file.write(generate_title_page_string(meta))
 
-        return "docx", prefix_files, []
+        return prefix_files, []
 
     elif f in [Format.latex, Format.latex_pdf]:
         # fmt: off
@@ -74,20 +102,17 @@ def prepare_command(cmd: list[str], f: Format) -> tuple[str, list[str], list[str
             "--variable", f"library_version={LIB_VERSION_STR}",
         ])
         # fmt: on
+        latex_vars = {}
         for k, v in meta["data"].items():
             if v:
                 if k == "date":
                     v = get_date_string()
-                # process any markdown inside the variables (italics in a title, for instance)
-                # fmt: off
-                marked_up = subprocess.check_output(["pandoc",
-                    "--from", PANDOC_INPUT_FORMAT,
-                    "--to", "latex"
-                ], input=v.encode("utf-8"))
-                # fmt: on
-                marked_up = marked_up.decode("utf-8").strip()
-
-                cmd.extend(["--variable", f"{k}={{{marked_up}}}"])
+                latex_vars[k] = v
+        # process any markdown inside the variables (italics in a title, for instance)
+        with profile_stage("metadata to LaTeX"):
+            marked_up = _markup_latex_values(list(latex_vars.values()))
+        for k, v in latex_vars.items():
+            cmd.extend(["--variable", f"{k}={{{marked_up[v]}}}"])
 
         if (
             "latex" in meta
@@ -110,86 +135,183 @@ def prepare_command(cmd: list[str], f: Format) -> tuple[str, list[str], list[str
                 typer.echo(f"Changing mono font to {meta['mono_font_override']}...")
             cmd.extend(["--variable", f"mono_font_override={meta['mono_font_override']}"])  # fmt: skip
 
-        return "tex", [], []
+        return [], []
 
     elif f == Format.json:
         cmd.extend(["--to", "json"])  # fmt: skip
-        return "json", [], []
+        return [], []
 
     else:
         raise RuntimeError(f"Unrecognized format: {f}")
 
 
+def _run_latex_markup(source: str) -> str:
+    return convert(source, PANDOC_INPUT_FORMAT, "latex")
+
+
+def _markup_latex_values(values: list[str]) -> dict[str, str]:
+    # results only depend on the value and the pandoc doing the converting,
+    #   so anything seen in the last build doesn't need to go through again
+    cache_key = hash_bytes(f"{PANDOC_INPUT_FORMAT}\n{get_tool_version('pandoc')}".encode("utf-8"))
+    cache = load_json_cache(LATEX_MARKUP_CACHE_NAME, {})
+    if cache.get("key") != cache_key:
+        cache = {"key": cache_key, "values": {}}
+
+    results = {v: cache["values"][v] for v in values if v in cache["values"]}
+    missing = list(dict.fromkeys([v for v in values if v not in results]))
+
+    if len(missing) > 0:
+        if PAPER_STATE["verbose"]:
+            typer.echo(f"Converting {len(missing)} metadata value(s) to LaTeX...")
+        # all the values go through in one document, each as its own paragraph(s),
+        #   with a separator paragraph that comes out the other side untouched
+        source = f"\n\n{LATEX_MARKUP_SEPARATOR}\n\n".join(missing)
+        converted = re.split(rf"^{LATEX_MARKUP_SEPARATOR}$", _run_latex_markup(source), flags=re.MULTILINE)
+        if len(converted) != len(missing):
+            # something in a value swallowed a separator; fall back to going one by one
+            converted = [_run_latex_markup(v) for v in missing]
+        for v, c in zip(missing, converted):
+            results[v] = c.strip()
+
+    # only keep what's currently in use so the cache doesn't grow forever
+    if len(missing) > 0 or len(results) != len(cache["values"]):
+        save_json_cache(LATEX_MARKUP_CACHE_NAME, {"key": cache_key, "values": results})
+
+    return results
+
+
+def _get_latex_aux_state(aux_dir: str, jobname: str) -> dict[str, str]:
+    # everything LaTeX writes for itself to read back on the next run
+    state = {}
+    for f in os.listdir(aux_dir):
+        name, ext = os.path.splitext(f)
+        if name == jobname and ext not in LATEX_NON_AUX_EXTENSIONS:
+            state[f] = hash_file(os.path.join(aux_dir, f))
+    return state
+
+
+def _get_latex_command(
+    tex_engine: str, aux_dir: str, jobname: str, tex_filename: str, precompiled: tuple[str, str] | None
+) -> list[str]:
+    # fmt: off
+    cmd = [
+        tex_engine,
+            "--halt-on-error",
+            "--interaction", "nonstopmode",
+            "--output-directory", aux_dir,
+            "--jobname", jobname,
+    ]
+    # fmt: on
+    if precompiled == None:
+        cmd.append(tex_filename)
+    else:
+        format_base, run_path = precompiled
+        cmd.extend(["--fmt", format_base, run_path])
+    return cmd
+
+
 def finish_file(filepath: str, f: Format) -> list[str]:
     log_lines = []
     meta = get_metadata()
 
     if f in [Format.docx, Format.docx_pdf]:
-        package(filepath, meta)
+        with profile_stage("package"):
+            package(filepath, meta)
         if f == Format.docx_pdf:
-            make_pdf(filepath, meta)
+            with profile_stage("make_pdf"):
+                make_pdf(filepath, meta)
 
     elif f == Format.latex_pdf:
+        # the aux files stick around between builds, so a document whose
+        #   references haven't moved only needs the one pass
+        aux_dir = os.path.abspath(ensure_cache_dir(LATEX_AUX_DIRECTORY))
+
         current = os.getcwd()
         output_path = os.path.dirname(filepath)
         os.chdir(output_path)
 
-        tmpdir = "pdf_out"
-        if os.path.exists(tmpdir):
-            shutil.rmtree(tmpdir)
-        os.mkdir(tmpdir)
-
         tex_engine = "xelatex"
-        # fmt: off
-        cmd = [
-            tex_engine,
-                "--halt-on-error",
-                "--interaction", "nonstopmode",
-                "--output-directory", tmpdir,
-                "--jobname", meta["filename"],
-                os.path.basename(filepath),
-        ]
-        # fmt: on
+        tex_filename = os.path.basename(filepath)
+        precompiled = None
+        if not (
+            "latex" in meta
+            and type(meta["latex"]) == dict
+            and "precompile_preamble" in meta["latex"]
+            and meta["latex"]["precompile_preamble"] == False
+        ):
+            with profile_stage("precompile preamble"):
+                precompiled = get_precompiled_preamble(tex_filename, aux_dir, tex_engine)
 
         try:
-            if PAPER_STATE["verbose"]:
-                typer.echo("Running LaTeX build command:")
-                typer.echo(f"\t{' '.join(cmd)}")
-            # LaTex needs to be run twice to do the pagination stuff
-            for _ in range(2):
-                output = subprocess.check_output(cmd).decode("utf-8")
+            aux_state = _get_latex_aux_state(aux_dir, meta["filename"])
+            for run in range(1, LATEX_MAX_RUNS + 1):
+                cmd = _get_latex_command(tex_engine, aux_dir, meta["filename"], tex_filename, precompiled)
+                if PAPER_STATE["verbose"]:
+                    typer.echo("Running LaTeX build command:")
+                    typer.echo(f"\t{' '.join(cmd)}")
+                try:
+                    with profile_stage(f"{tex_engine} (run {run})"):
+                        output = subprocess.check_output(cmd).decode("utf-8")
+                except subprocess.CalledProcessError:
+                    if precompiled == None:
+                        raise
+                    # could be the format or could be the document; running
+                    #   without the format tells which
+                    if PAPER_STATE["verbose"]:
+                        typer.echo("LaTeX failed with the precompiled preamble; retrying without it...")
+                    format_base = precompiled[0]
+                    precompiled = None
+                    for aux_file in aux_state:
+                        os.unlink(os.path.join(aux_dir, aux_file))
+                    aux_state = {}
+                    cmd = _get_latex_command(tex_engine, aux_dir, meta["filename"], tex_filename, None)
+                    with profile_stage(f"{tex_engine} (run {run}, without preamble format)"):
+                        output = subprocess.check_output(cmd).decode("utf-8")
+                    discard_precompiled_preamble(format_base, failed=True)
                 if PAPER_STATE["verbose"]:
                     typer.echo(output)
+                new_aux_state = _get_latex_aux_state(aux_dir, meta["filename"])
+                if new_aux_state == aux_state:
+                    break
+                aux_state = new_aux_state
+            else:
+                typer.echo(f"LaTeX references still changing after {LATEX_MAX_RUNS} runs; giving up.")
+            if PAPER_STATE["verbose"]:
+                typer.echo(f"LaTeX finished after {run} run(s).")
+
             pdf_filename = f"{meta['filename']}.pdf"
             if os.path.exists(pdf_filename):
                 os.unlink(pdf_filename)
             shutil.move(
-                os.path.join(tmpdir, pdf_filename),
+                os.path.join(aux_dir, pdf_filename),
                 ".",
             )
 
-            engine_data = subprocess.check_output([tex_engine, "--version"]).decode("utf-8").strip()
-            log_lines.extend(engine_data.splitlines())
+            log_lines.extend(get_tool_version(tex_engine).splitlines())
             log_lines.append("-----")
-            log_data = open(os.path.join(tmpdir, f"{meta['filename']}.log")).read()
+            if precompiled != None:
+                log_lines.extend(get_precompiled_packages(precompiled[0]))
+            with open(os.path.join(aux_dir, f"{meta['filename']}.log")) as log_file:
+                log_data = log_file.read()
             package_data = [l[len("Package: ") :] for l in log_data.splitlines() if l.startswith("Package: ")]
             log_lines.extend(package_data)
 
         except subprocess.CalledProcessError as e:
+            # a run that died partway through can leave aux files that break the next one
+            shutil.rmtree(aux_dir)
             typer.echo(f"{tex_engine.upper()} ERROR: {e.returncode}")
             typer.echo(e.output.decode("utf-8").replace("\\n", "\n"))
             sys.exit(e.returncode)
 
         finally:
-            shutil.rmtree(tmpdir)
-
-        os.chdir(current)
+            os.chdir(current)
 
     elif f == Format.json:
         if PAPER_STATE["verbose"]:
             typer.echo("Prettifying JSON output...")
 
-        json_in = json.load(open(filepath, "r"))
+        with open(filepath, "r") as infile:
+            json_in = json.load(infile)
         with open(filepath, "w") as outfile:
             json.dump(json_in, outfile, indent="  ")
 
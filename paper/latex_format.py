@@ -0,0 +1,157 @@
+import os
+import re
+import time
+import subprocess
+
+import typer
+
+from .shared import PAPER_STATE
+from .cache import ensure_cache_dir, get_user_cache_dir, hash_bytes
+from .environment import get_tool_version
+
+LATEX_FORMAT_DIRECTORY = os.path.join(get_user_cache_dir(), "latex_formats")
+LATEX_FORMAT_MAX_AGE = 60 * 60 * 24 * 30
+# long enough not to keep paying for a dump that fails, short enough that
+#   installing a missing package gets picked up without clearing anything
+LATEX_FORMAT_RETRY_AFTER = 60 * 60 * 24
+
+# XeTeX can't dump fonts loaded through fontspec into a format, so the dump
+#   stops at the first line that picks one (or at the document itself)
+_DUMP_STOP_PATTERN = re.compile(
+    r"^[ \t]*\\(setmainfont|setsansfont|setmonofont|setmathfont|newfontfamily|newfontface|begin\{document\})",
+    flags=re.MULTILINE,
+)
+
+
+def _split_preamble(tex: str) -> tuple[str, str] | None:
+    # fragments don't have a preamble to speak of
+    if not tex.lstrip().startswith("\\documentclass"):
+        return None
+    stop = _DUMP_STOP_PATTERN.search(tex)
+    if stop == None:
+        return None
+    return tex[: stop.start()], tex[stop.start() :]
+
+
+def _dump_format(preamble: str, format_base: str, tex_engine: str) -> bool:
+    # written under a per-process name and renamed at the end, since
+    #   several projects can share the same format
+    format_dir = os.path.dirname(format_base)
+    jobname = f"{os.path.basename(format_base)}.{os.getpid()}"
+    job_base = os.path.join(format_dir, jobname)
+    with open(f"{job_base}.tex", "w") as preamble_file:
+        preamble_file.write(preamble)
+        preamble_file.write("\\endofdump\n")
+
+    # fmt: off
+    cmd = [
+        tex_engine,
+            "-ini",
+            "--halt-on-error",
+            "--interaction", "nonstopmode",
+            "--output-directory", format_dir,
+            "--jobname", jobname,
+            f"&{tex_engine}", "mylatexformat.ltx", f"{job_base}.tex",
+    ]
+    # fmt: on
+    if PAPER_STATE["verbose"]:
+        typer.echo("Precompiling the LaTeX preamble:")
+        typer.echo(f"\t{' '.join(cmd)}")
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+
+    success = result.returncode == 0 and os.path.exists(f"{job_base}.fmt")
+    if success:
+        os.replace(f"{job_base}.log", f"{format_base}.log")
+        os.replace(f"{job_base}.fmt", f"{format_base}.fmt")
+    elif PAPER_STATE["verbose"]:
+        typer.echo("Couldn't precompile the LaTeX preamble; loading it the usual way.")
+        typer.echo(result.stdout.decode("utf-8", errors="replace"))
+    for ext in [".tex", ".log", ".fmt"]:
+        if os.path.exists(f"{job_base}{ext}"):
+            os.unlink(f"{job_base}{ext}")
+    return success
+
+
+def get_precompiled_preamble(tex_path: str, work_dir: str, tex_engine: str) -> tuple[str, str] | None:
+    # returns the format to load and the file to run with it, or None if
+    #   this document has to be built the usual way
+    with open(tex_path, "r") as tex_file:
+        split = _split_preamble(tex_file.read())
+    if split == None:
+        return None
+    preamble, body = split
+
+    # the dumped text covers the template and anything pandoc filled into it
+    #   (like the class options); the font overrides come after the cut
+    key = hash_bytes("\0".join([get_tool_version(tex_engine), preamble]).encode("utf-8"))
+    format_base = os.path.join(ensure_cache_dir(LATEX_FORMAT_DIRECTORY), key)
+    _prune_formats(key)
+
+    if _failed_recently(format_base):
+        return None
+    # touched to keep it from getting pruned; if another project's build pruned it
+    #   just now, it gets made again
+    have_format = True
+    for ext in [".fmt", ".log"]:
+        try:
+            os.utime(f"{format_base}{ext}")
+        except FileNotFoundError:
+            have_format = have_format and ext != ".fmt"
+    if not have_format and not _dump_format(preamble, format_base, tex_engine):
+        open(f"{format_base}.failed", "w").close()
+        return None
+
+    # the format skips everything in the document up to \endofdump
+    run_path = os.path.join(work_dir, f"{os.path.splitext(os.path.basename(tex_path))[0]}.body.tex")
+    with open(run_path, "w") as run_file:
+        run_file.write(preamble)
+        run_file.write("\\endofdump\n")
+        run_file.write(body)
+    return format_base, run_path
+
+
+def _failed_recently(format_base: str) -> bool:
+    # the marker's mtime is when it last failed
+    failed_path = f"{format_base}.failed"
+    # other builds (build-all runs several) can be clearing it out at the same time
+    try:
+        if time.time() - os.path.getmtime(failed_path) < LATEX_FORMAT_RETRY_AFTER:
+            return True
+        os.unlink(failed_path)
+    except FileNotFoundError:
+        pass
+    return False
+
+
+def get_precompiled_packages(format_base: str) -> list[str]:
+    # packages loaded into the format don't show up in the document's own log
+    log_path = f"{format_base}.log"
+    if not os.path.exists(log_path):
+        return []
+    with open(log_path, "r", errors="replace") as log_file:
+        log_data = log_file.read()
+    return [l[len("Package: ") :] for l in log_data.splitlines() if l.startswith("Package: ")]
+
+
+def discard_precompiled_preamble(format_base: str, failed: bool):
+    for ext in [".fmt", ".log"]:
+        try:
+            os.unlink(f"{format_base}{ext}")
+        except FileNotFoundError:
+            pass
+    if failed:
+        open(f"{format_base}.failed", "w").close()
+
+
+def _prune_formats(keep: str):
+    now = time.time()
+    for f in os.listdir(LATEX_FORMAT_DIRECTORY):
+        path = os.path.join(LATEX_FORMAT_DIRECTORY, f)
+        if f.startswith(keep) or not os.path.isfile(path):
+            continue
+        # another project's build might be pruning the same files
+        try:
+            if now - os.path.getmtime(path) > LATEX_FORMAT_MAX_AGE:
+                os.unlink(path)
+        except FileNotFoundError:
+            pass
@@ -1,37 +1,77 @@
-import subprocess
+import os
+from concurrent.futures import ThreadPoolExecutor
 
 import typer
 
 from .util import ensure_paper_dir, get_content_file_list
 from .shared import PANDOC_INPUT_FORMAT, PAPER_STATE
+from .cache import hash_bytes, hash_file, load_json_cache, save_json_cache
+from .environment import get_tool_version
+from .pandoc_server import convert
 
+FMT_CACHE_NAME = "fmt.json"
 
-def fmt(wrap: bool, columns: int):
+
+def _format_file(cf: str, wrap: bool, columns: int, check: bool) -> tuple[bool, str]:
+    # returns whether the file needed reformatting, and the hash of what's on disk afterwards
+    with open(cf, "rb") as md_file:
+        md_bytes = md_file.read()
+    # same newline handling as reading in text mode, so CRLF files don't count as changed
+    md_curr = md_bytes.decode("utf-8").replace("\r\n", "\n")
+    if wrap:
+        md_out = convert(md_curr, PANDOC_INPUT_FORMAT, PANDOC_INPUT_FORMAT, wrap="auto", columns=columns)
+    else:
+        md_out = convert(md_curr, PANDOC_INPUT_FORMAT, PANDOC_INPUT_FORMAT, wrap="preserve")
+    if md_out.strip() == md_curr.strip():
+        return False, hash_bytes(md_bytes)
+    if check:
+        return True, None
+    if PAPER_STATE["verbose"]:
+        typer.echo(f"Reformatting {cf}...")
+    with open(cf, "w", encoding="utf-8") as out:
+        out.write(md_out)
+    # whatever newlines actually went onto the disk
+    return True, hash_file(cf)
+
+
+def fmt(wrap: bool, columns: int, jobs: int | None = None, check: bool = False):
     ensure_paper_dir()
 
+    # a file that came out of the formatter unchanged will keep doing so,
+    #   as long as it's the same settings and the same pandoc
+    settings = [PANDOC_INPUT_FORMAT, get_tool_version("pandoc"), str(wrap), str(columns if wrap else 0)]
+    cache_key = hash_bytes("\0".join(settings).encode("utf-8"))
+    cache = load_json_cache(FMT_CACHE_NAME, {})
+    if cache.get("key") != cache_key:
+        cache = {"key": cache_key, "clean": {}}
+
+    clean = {}
+    to_format = []
     for cf in get_content_file_list():
-        # fmt: off
-        cmd = ["pandoc",
-            "--from", PANDOC_INPUT_FORMAT,
-            "--to", PANDOC_INPUT_FORMAT,
-        ]
-        if wrap:
-            cmd.extend([
-                "--wrap", "auto",
-                "--columns", str(columns),
-            ])
+        file_hash = hash_file(cf)
+        if cache["clean"].get(cf) == file_hash:
+            clean[cf] = file_hash
         else:
-            cmd.extend([
-                "--wrap", "preserve",
-            ])
-        # fmt: on
-
-        cmd.append(cf)
-
-        md_out = subprocess.check_output(cmd).decode("utf-8")
-        md_curr = open(cf, "r").read()
-        if md_out.strip() != md_curr.strip():
-            if PAPER_STATE["verbose"]:
-                typer.echo(f"Reformatting {cf}...")
-            with open(cf, "w") as out:
-                out.write(md_out)
+            to_format.append(cf)
+
+    if PAPER_STATE["verbose"] and len(clean) > 0:
+        typer.echo(f"Skipping {len(clean)} file(s) unchanged since they were last formatted.")
+
+    if jobs == None:
+        jobs = os.cpu_count() or 1
+    changed = []
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as pool:
+        results = pool.map(lambda cf: _format_file(cf, wrap, columns, check), to_format)
+        for cf, (needed_formatting, file_hash) in zip(to_format, results):
+            if needed_formatting:
+                changed.append(cf)
+            if file_hash != None:
+                clean[cf] = file_hash
+
+    save_json_cache(FMT_CACHE_NAME, {"key": cache_key, "clean": clean})
+
+    if check:
+        for cf in changed:
+            typer.echo(f"Would reformat {cf}")
+        if len(changed) > 0:
+            raise typer.Exit(1)
@@ -0,0 +1,158 @@
+import json
+import time
+import atexit
+import socket
+import threading
+import subprocess
+import http.client
+
+import typer
+
+from .shared import PAPER_STATE
+
+PANDOC_SERVER_STARTUP_TIMEOUT = 5.0
+PANDOC_SERVER_REQUEST_TIMEOUT = 60
+
+_server_lock = threading.Lock()
+_server_proc = None
+_local = threading.local()
+
+
+class _ServerError(Exception):
+    pass
+
+
+def _get_free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _is_responding(port: int) -> bool:
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+    try:
+        conn.request("GET", "/version")
+        response = conn.getresponse()
+        response.read()
+        return response.status == 200
+    except (OSError, http.client.HTTPException):
+        return False
+    finally:
+        conn.close()
+
+
+def _stop_server():
+    global _server_proc
+    if _server_proc != None:
+        _server_proc.terminate()
+        try:
+            _server_proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            _server_proc.kill()
+        _server_proc = None
+
+
+def start_pandoc_server() -> int | None:
+    # one server per command; it gets its port put into the shared state so
+    #   build worker processes talk to it instead of starting their own
+    global _server_proc
+    with _server_lock:
+        if "pandoc_server_port" in PAPER_STATE:
+            return PAPER_STATE["pandoc_server_port"]
+
+        port = _get_free_port()
+        # `pandoc server` from pandoc 3 on; before that it was its own executable
+        for cmd in [["pandoc", "server"], ["pandoc-server"]]:
+            try:
+                proc = subprocess.Popen(
+                    cmd + ["--port", str(port)], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+                )
+            except FileNotFoundError:
+                continue
+            deadline = time.monotonic() + PANDOC_SERVER_STARTUP_TIMEOUT
+            while proc.poll() == None and time.monotonic() < deadline:
+                if _is_responding(port):
+                    break
+                time.sleep(0.05)
+            if proc.poll() == None and _is_responding(port):
+                _server_proc = proc
+                atexit.register(_stop_server)
+                if PAPER_STATE["verbose"]:
+                    typer.echo(f"Started pandoc server on port {port}.")
+                PAPER_STATE["pandoc_server_port"] = port
+                return port
+            if proc.poll() == None:
+                proc.kill()
+                proc.wait()
+
+        if PAPER_STATE["verbose"]:
+            typer.echo("Couldn't start a pandoc server; running pandoc processes instead.")
+        PAPER_STATE["pandoc_server_port"] = None
+        return None
+
+
+def _get_connection(port: int) -> http.client.HTTPConnection:
+    # one kept-alive connection per thread
+    conn = getattr(_local, "conn", None)
+    if conn == None or conn.port != port:
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=PANDOC_SERVER_REQUEST_TIMEOUT)
+        _local.conn = conn
+    return conn
+
+
+def _convert_with_server(port: int, request: dict) -> str:
+    conn = _get_connection(port)
+    body = json.dumps(request).encode("utf-8")
+    headers = {"Content-Type": "application/json", "Accept": "application/json"}
+    try:
+        conn.request("POST", "/", body, headers)
+        response = conn.getresponse()
+        response_data = response.read()
+    except (OSError, http.client.HTTPException):
+        conn.close()
+        _local.conn = None
+        raise
+    if response.status != 200:
+        raise _ServerError(response_data.decode("utf-8", errors="replace"))
+    result = json.loads(response_data)
+    if result.get("base64", False):
+        raise _ServerError("binary output")
+    output = result["output"]
+    # the command line tacks a newline onto its output; the server doesn't
+    if not output.endswith("\n"):
+        output += "\n"
+    return output
+
+
+def _convert_with_subprocess(source: str, request: dict) -> str:
+    # fmt: off
+    cmd = ["pandoc",
+        "--from", request["from"],
+        "--to", request["to"],
+    ]
+    # fmt: on
+    if "wrap" in request:
+        cmd.extend(["--wrap", request["wrap"]])
+    if "columns" in request:
+        cmd.extend(["--columns", str(request["columns"])])
+    return subprocess.check_output(cmd, input=source.encode("utf-8")).decode("utf-8")
+
+
+def convert(source: str, from_format: str, to_format: str, wrap: str | None = None, columns: int | None = None) -> str:
+    # only for plain conversions; the server doesn't run filters
+    request = {"text": source, "from": from_format, "to": to_format}
+    if wrap != None:
+        request["wrap"] = wrap
+    if columns != None:
+        request["columns"] = columns
+
+    if PAPER_STATE.get("pandoc_server", False):
+        port = start_pandoc_server()
+        if port != None:
+            try:
+                return _convert_with_server(port, request)
+            except (OSError, http.client.HTTPException, json.JSONDecodeError, KeyError, _ServerError) as e:
+                if PAPER_STATE["verbose"]:
+                    typer.echo(f"pandoc server request failed ({e}); running pandoc directly.")
+
+    return _convert_with_subprocess(source, request)
@@ -0,0 +1,199 @@
+import os
+import sys
+import json
+import time
+import resource
+import threading
+import contextlib
+
+import typer
+
+from .shared import PAPER_STATE
+from .cache import PAPER_DATA_DIRECTORY, ignore_in_git
+
+PROFILE_TRACE_NAME = "build_profile.json"
+
+# stages timed here, plus the per-function totals the Lua filter chain writes out
+_events = {"stages": [], "filters": []}
+_events_lock = threading.Lock()
+
+
+def _get_max_rss_kb(usage: resource.struct_rusage) -> int:
+    # kilobytes on Linux, bytes on macOS
+    if sys.platform == "darwin":
+        return usage.ru_maxrss // 1024
+    return usage.ru_maxrss
+
+
+@contextlib.contextmanager
+def profile_stage(name: str):
+    if not PAPER_STATE.get("profile", False):
+        yield
+        return
+
+    start_time = time.time()
+    start_counter = time.perf_counter()
+    self_start = resource.getrusage(resource.RUSAGE_SELF)
+    children_start = resource.getrusage(resource.RUSAGE_CHILDREN)
+    try:
+        yield
+    finally:
+        wall = time.perf_counter() - start_counter
+        self_end = resource.getrusage(resource.RUSAGE_SELF)
+        children_end = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+        # CPU is this process (all threads) plus any subprocesses that finished in the meantime
+        cpu = (self_end.ru_utime - self_start.ru_utime) + (self_end.ru_stime - self_start.ru_stime)
+        cpu += (children_end.ru_utime - children_start.ru_utime) + (children_end.ru_stime - children_start.ru_stime)
+
+        # the OS only keeps a high-water mark, for this process and for the
+        #   biggest subprocess so far; if a subprocess set a new one during
+        #   this stage, that's the number that matters
+        peak_rss_kb = _get_max_rss_kb(self_end)
+        if children_end.ru_maxrss > children_start.ru_maxrss:
+            peak_rss_kb = _get_max_rss_kb(children_end)
+
+        with _events_lock:
+            _events["stages"].append(
+                {
+                    "name": name,
+                    "pid": os.getpid(),
+                    "tid": threading.get_native_id(),
+                    "start": start_time,
+                    "wall": wall,
+                    "cpu": cpu,
+                    "peak_rss_kb": peak_rss_kb,
+                }
+            )
+
+
+def take_profile_events() -> dict[str, list[dict]]:
+    # for shipping the events from a build worker back to the main process
+    global _events
+    with _events_lock:
+        events = _events
+        _events = {"stages": [], "filters": []}
+    return events
+
+
+def add_profile_events(events: dict[str, list[dict]]):
+    with _events_lock:
+        for kind in _events:
+            _events[kind].extend(events[kind])
+
+
+def add_filter_profile(label: str, profile_path: str):
+    # one tab-separated line per filter function: group, filter, function, calls, CPU seconds
+    if not os.path.exists(profile_path):
+        return
+    with open(profile_path, "r") as profile_file:
+        lines = [l.rstrip("\n").split("\t") for l in profile_file if len(l.strip()) > 0]
+    os.unlink(profile_path)
+    with _events_lock:
+        for group, filter_name, function, calls, seconds in lines:
+            _events["filters"].append(
+                {
+                    "label": label,
+                    "group": group,
+                    "filter": filter_name,
+                    "function": function,
+                    "calls": int(calls),
+                    "cpu": float(seconds),
+                }
+            )
+
+
+def _get_depth(event: dict, events: list[dict], main_pid: int) -> int:
+    # nesting comes from the timing, since stages run in build workers don't
+    #   know what they were called from; a worker's stages sit under whatever
+    #   the main process was doing at the time, but not under each other's
+    end = event["start"] + event["wall"]
+    depth = 0
+    for e in events:
+        if e is event or e["pid"] not in [event["pid"], main_pid]:
+            continue
+        if e["start"] <= event["start"] and e["start"] + e["wall"] >= end:
+            depth += 1
+    return depth
+
+
+def _write_trace(events: list[dict]) -> str:
+    # https://docs.google.com/document/d/1CvAClvFfyA5R-PhYUmn5OOQtYMH4h6I0nSsKchNAySU
+    trace_start = min([e["start"] for e in events])
+    trace_events = []
+    for e in events:
+        trace_events.append(
+            {
+                "name": e["name"],
+                "cat": "paper",
+                "ph": "X",
+                "ts": round((e["start"] - trace_start) * 1_000_000),
+                "dur": round(e["wall"] * 1_000_000),
+                "pid": e["pid"],
+                "tid": e["tid"],
+                "args": {"cpu_seconds": round(e["cpu"], 6), "peak_rss_kb": e["peak_rss_kb"]},
+            }
+        )
+    # a build that stopped early might not have made it yet
+    os.makedirs(PAPER_DATA_DIRECTORY, exist_ok=True)
+    trace_path = os.path.join(PAPER_DATA_DIRECTORY, PROFILE_TRACE_NAME)
+    # the rest of .paper_data gets committed, but this is just one machine's timings
+    ignore_in_git(PAPER_DATA_DIRECTORY, PROFILE_TRACE_NAME)
+    with open(trace_path, "w") as trace_file:
+        json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, trace_file)
+    return trace_path
+
+
+def _echo_table(headers: list[str], rows: list[list[str]]):
+    # first column to the left, numbers to the right
+    widths = [max([len(r[i]) for r in rows] + [len(headers[i])]) for i in range(len(headers))]
+    for r in [headers, ["-" * w for w in widths]] + rows:
+        typer.echo(f"{r[0]:<{widths[0]}}  " + "  ".join([f"{c:>{w}}" for c, w in zip(r[1:], widths[1:])]))
+
+
+def _report_filters(filter_events: list[dict]):
+    # slowest first, within each format's pandoc run
+    rows = []
+    labels = list(dict.fromkeys([e["label"] for e in filter_events]))
+    for label in labels:
+        rows.append([label, "", ""])
+        by_filter = {}
+        for e in filter_events:
+            if e["label"] == label:
+                by_filter.setdefault(e["filter"], []).append(e)
+        filter_totals = {f: sum([e["cpu"] for e in fe]) for f, fe in by_filter.items()}
+        for filter_name in sorted(by_filter, key=lambda f: -filter_totals[f]):
+            rows.append([f"  {filter_name}", "", f"{filter_totals[filter_name]:.3f}"])
+            for e in sorted(by_filter[filter_name], key=lambda e: -e["cpu"]):
+                rows.append([f"    {e['function']}", str(e["calls"]), f"{e['cpu']:.3f}"])
+    typer.echo()
+    _echo_table(["Filter", "Calls", "CPU (s)"], rows)
+
+
+def report_profile():
+    events = take_profile_events()
+    stage_events = events["stages"]
+    if len(stage_events) == 0:
+        return
+    main_pid = os.getpid()
+    # keep each worker's stages together rather than interleaving the formats
+    group_starts = {}
+    for e in stage_events:
+        group_starts[e["pid"]] = min(group_starts.get(e["pid"], e["start"]), e["start"])
+    stage_events.sort(
+        key=lambda e: (e["start"] if e["pid"] == main_pid else group_starts[e["pid"]], e["pid"], e["start"], -e["wall"])
+    )
+
+    rows = []
+    for e in stage_events:
+        label = f"{'  ' * _get_depth(e, stage_events, main_pid)}{e['name']}"
+        rows.append([label, f"{e['wall']:.3f}", f"{e['cpu']:.3f}", f"{e['peak_rss_kb'] / 1024:.1f}"])
+    typer.echo()
+    _echo_table(["Stage", "Wall (s)", "CPU (s)", "Peak RSS (MB)"], rows)
+
+    if len(events["filters"]) > 0:
+        _report_filters(events["filters"])
+
+    trace_path = _write_trace(stage_events)
+    typer.echo()
+    typer.echo(f"Trace written to {trace_path} (open it in chrome://tracing or https://ui.perfetto.dev).")
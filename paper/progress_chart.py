@@ -0,0 +1,233 @@
+import math
+from datetime import datetime, timedelta
+from xml.sax.saxutils import escape
+
+# same canvas size and colors that matplotlib's defaults produced, so READMEs don't jump around
+CHART_WIDTH = 460.8
+CHART_HEIGHT = 345.6
+CHART_FONT = (
+    "-apple-system, BlinkMacSystemFont, 'Segoe UI', Helvetica, Arial, sans-serif, 'Apple Color Emoji', 'Segoe UI Emoji'"
+)
+LINE_COLOR = "#1f77b4"
+GOAL_COLOR = "green"
+DUE_COLOR = "red"
+
+_MARGIN_LEFT = 62.0
+_MARGIN_RIGHT = 12.0
+_MARGIN_TOP = 26.0
+_MARGIN_BOTTOM = 52.0
+_FONT_SIZE = 10.0
+_TICK_LENGTH = 3.5
+
+_DAY_SECONDS = 60 * 60 * 24
+
+
+def lttb_downsample(points: list[tuple[float, float]], max_points: int) -> list[tuple[float, float]]:
+    # Largest-Triangle-Three-Buckets: keeps the first and last points, then
+    #   picks the point from each bucket that best preserves the visual shape
+    #   https://skemman.is/bitstream/1946/15343/3/SS_MSthesis.pdf
+    if max_points < 3 or len(points) <= max_points:
+        return list(points)
+
+    sampled = [points[0]]
+    bucket_size = (len(points) - 2) / (max_points - 2)
+    prev = points[0]
+    for i in range(max_points - 2):
+        bucket_start = int(math.floor(i * bucket_size)) + 1
+        bucket_end = int(math.floor((i + 1) * bucket_size)) + 1
+
+        next_start = bucket_end
+        next_end = min(int(math.floor((i + 2) * bucket_size)) + 1, len(points))
+        next_bucket = points[next_start:next_end]
+        if len(next_bucket) == 0:
+            next_bucket = [points[-1]]
+        avg_x = sum([p[0] for p in next_bucket]) / len(next_bucket)
+        avg_y = sum([p[1] for p in next_bucket]) / len(next_bucket)
+
+        best = None
+        best_area = -1.0
+        for p in points[bucket_start:bucket_end]:
+            area = abs((prev[0] - avg_x) * (p[1] - prev[1]) - (prev[0] - p[0]) * (avg_y - prev[1]))
+            if area > best_area:
+                best_area = area
+                best = p
+        sampled.append(best)
+        prev = best
+    sampled.append(points[-1])
+    return sampled
+
+
+def _nice_ticks(low: float, high: float, max_ticks: int = 8) -> list[float]:
+    if high <= low:
+        high = low + 1
+    raw_step = (high - low) / max_ticks
+    magnitude = 10 ** math.floor(math.log10(raw_step))
+    step = magnitude * 10
+    for multiple in [1, 2, 2.5, 5, 10]:
+        if multiple * magnitude >= raw_step:
+            step = multiple * magnitude
+            break
+    ticks = []
+    tick = math.ceil(low / step) * step
+    while tick <= high + step * 1e-9:
+        ticks.append(tick)
+        tick += step
+    return ticks
+
+
+def _date_ticks(low: float, high: float, max_ticks: int = 7) -> list[float]:
+    # low/high are timestamps; ticks land on midnights, firsts of the month, or New Year's
+    start = datetime.fromtimestamp(low)
+    end = datetime.fromtimestamp(high)
+    span_days = (high - low) / _DAY_SECONDS
+
+    for step_days in [1, 2, 3, 7, 14]:
+        if span_days / step_days <= max_ticks:
+            tick = datetime(start.year, start.month, start.day)
+            if tick < start:
+                tick += timedelta(days=1)
+            ticks = []
+            while tick <= end:
+                ticks.append(tick.timestamp())
+                tick += timedelta(days=step_days)
+            return ticks
+
+    for step_months in [1, 2, 3, 4, 6, 12, 24, 60, 120]:
+        if span_days / (30.4 * step_months) <= max_ticks:
+            month_index = start.year * 12 + start.month - 1
+            if datetime(start.year, start.month, 1) < start:
+                month_index += 1
+            month_index = int(math.ceil(month_index / step_months) * step_months)
+            ticks = []
+            while True:
+                tick = datetime(month_index // 12, month_index % 12 + 1, 1)
+                if tick > end:
+                    break
+                ticks.append(tick.timestamp())
+                month_index += step_months
+            return ticks
+
+    return [low, high]
+
+
+def _format_number(value: float) -> str:
+    if value == int(value):
+        return str(int(value))
+    return f"{value:g}"
+
+
+def _text(x: float, y: float, lines: list[str], anchor: str, extra: str = "") -> str:
+    out = f'<text x="{x:.2f}" y="{y:.2f}" text-anchor="{anchor}"{extra}>'
+    for i, line in enumerate(lines):
+        dy = "0" if i == 0 else "1.2em"
+        out += f'<tspan x="{x:.2f}" dy="{dy}">{escape(line)}</tspan>'
+    out += "</text>"
+    return out
+
+
+def render_progress_svg(
+    timestamps: list[float], word_counts: list[int], due_date: float | None, goal_wc: int | None
+) -> str:
+    # axis limits, with the same padding rules the matplotlib version used
+    if goal_wc:
+        ymin = 0
+        ymax = max(word_counts + [goal_wc]) + max(goal_wc * 0.05, 100)
+    else:
+        y_margin = max((max(word_counts) - min(word_counts)) * 0.05, 1)
+        ymin = min(word_counts) - y_margin
+        ymax = max(word_counts) + y_margin
+
+    xmin = min(timestamps) - _DAY_SECONDS
+    if due_date:
+        xmax = max(max(timestamps), due_date)
+    else:
+        xmax = max(timestamps)
+    xmax += max((xmax - xmin) * 0.05, 2 * _DAY_SECONDS)
+    if due_date and not xmin <= due_date <= xmax:
+        # a due date from before any of the data would be off the left edge
+        due_date = None
+
+    yticks = [t for t in _nice_ticks(ymin, ymax) if ymin <= t <= ymax]
+    if goal_wc and goal_wc not in yticks:
+        yticks.append(goal_wc)
+        yticks.sort()
+
+    xticks = [t for t in _date_ticks(xmin, xmax) if xmin <= t <= xmax]
+    if due_date and due_date not in xticks:
+        # the due date gets a tick of its own, elbowing out its neighbors so the labels don't collide
+        xticks.append(due_date)
+        xticks.sort()
+        idx = xticks.index(due_date)
+        if idx < len(xticks) - 1:
+            xticks.pop(idx + 1)
+        if idx > 0:
+            xticks.pop(idx - 1)
+
+    plot_left = _MARGIN_LEFT
+    plot_right = CHART_WIDTH - _MARGIN_RIGHT
+    plot_top = _MARGIN_TOP
+    plot_bottom = CHART_HEIGHT - _MARGIN_BOTTOM
+
+    def px(x: float) -> float:
+        return plot_left + (x - xmin) / (xmax - xmin) * (plot_right - plot_left)
+
+    def py(y: float) -> float:
+        return plot_bottom - (y - ymin) / (ymax - ymin) * (plot_bottom - plot_top)
+
+    parts = []
+    parts.append(
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{CHART_WIDTH}pt" height="{CHART_HEIGHT}pt" '
+        f'viewBox="0 0 {CHART_WIDTH} {CHART_HEIGHT}" version="1.1">'
+    )
+    parts.append(f'<g style="font-family: {CHART_FONT}; font-size: {_FONT_SIZE}px; fill: #000000">')
+    parts.append(f'<rect width="{CHART_WIDTH}" height="{CHART_HEIGHT}" style="fill: #ffffff"/>')
+
+    # data first, clipped to the plot area, then the annotation lines on top of it
+    parts.append(
+        f'<clipPath id="plot-area"><rect x="{plot_left:.2f}" y="{plot_top:.2f}" '
+        f'width="{plot_right - plot_left:.2f}" height="{plot_bottom - plot_top:.2f}"/></clipPath>'
+    )
+    parts.append('<g clip-path="url(#plot-area)" style="fill: none; stroke-width: 1.5">')
+    line_points = " ".join([f"{px(x):.2f},{py(y):.2f}" for x, y in zip(timestamps, word_counts)])
+    parts.append(f'<polyline points="{line_points}" style="stroke: {LINE_COLOR}"/>')
+    if goal_wc:
+        parts.append(
+            f'<line x1="{plot_left:.2f}" y1="{py(goal_wc):.2f}" x2="{plot_right:.2f}" y2="{py(goal_wc):.2f}" '
+            f'style="stroke: {GOAL_COLOR}"/>'
+        )
+    if due_date:
+        parts.append(
+            f'<line x1="{px(due_date):.2f}" y1="{plot_top:.2f}" x2="{px(due_date):.2f}" y2="{plot_bottom:.2f}" '
+            f'style="stroke: {DUE_COLOR}"/>'
+        )
+    parts.append("</g>")
+
+    # frame and ticks
+    parts.append('<g style="fill: none; stroke: #000000; stroke-width: 0.8">')
+    parts.append(
+        f'<rect x="{plot_left:.2f}" y="{plot_top:.2f}" '
+        f'width="{plot_right - plot_left:.2f}" height="{plot_bottom - plot_top:.2f}"/>'
+    )
+    for t in yticks:
+        parts.append(
+            f'<line x1="{plot_left - _TICK_LENGTH:.2f}" y1="{py(t):.2f}" x2="{plot_left:.2f}" y2="{py(t):.2f}"/>'
+        )
+    for t in xticks:
+        parts.append(
+            f'<line x1="{px(t):.2f}" y1="{plot_bottom:.2f}" x2="{px(t):.2f}" y2="{plot_bottom + _TICK_LENGTH:.2f}"/>'
+        )
+    parts.append("</g>")
+
+    # labels
+    for t in yticks:
+        parts.append(_text(plot_left - _TICK_LENGTH - 3, py(t) + _FONT_SIZE * 0.35, [_format_number(t)], "end"))
+    for t in xticks:
+        label = datetime.fromtimestamp(t).strftime("%h\n%d\n%Y").splitlines()
+        parts.append(_text(px(t), plot_bottom + _TICK_LENGTH + _FONT_SIZE + 2, label, "middle"))
+    parts.append(_text((plot_left + plot_right) / 2, plot_top - 8, ["Progress"], "middle", ' font-size="12px"'))
+    label_y = (plot_top + plot_bottom) / 2
+    parts.append(_text(14, label_y, ["Word Count"], "middle", f' transform="rotate(-90 14 {label_y:.2f})"'))
+
+    parts.append("</g>")
+    parts.append("</svg>")
+    return "\n".join(parts) + "\n"
@@ -0,0 +1,176 @@
+-- Runs a whole list of filter scripts as a single filter, so they share one
+--   Lua state (and one load of util.lua) instead of pandoc setting everything
+--   up again for each `--lua-filter`.
+-- Neighboring passes get folded into the same traversal when that can't change
+--   the result: pandoc applies a filter's functions in a fixed order (Inline
+--   elements, Inlines, Block elements, Blocks, Meta, Pandoc), each over the
+--   whole document, so a pass whose functions all come later in that order
+--   than everything in the previous one sees exactly what it would have seen
+--   running on its own.
+-- With PAPER_FILTER_PROFILE_PATH set, every filter function also gets timed
+--   and counted, and the totals appended to that file once the group is done.
+
+-- stylua: ignore
+local inline_types = {
+  "Inline", "Str", "Emph", "Underline", "Strong", "Strikeout", "Superscript", "Subscript", "SmallCaps",
+  "Quoted", "Cite", "Code", "Space", "SoftBreak", "LineBreak", "Math", "RawInline", "Link", "Image",
+  "Note", "Span",
+}
+-- stylua: ignore
+local block_types = {
+  "Block", "Plain", "Para", "LineBlock", "CodeBlock", "RawBlock", "BlockQuote", "OrderedList",
+  "BulletList", "DefinitionList", "Header", "HorizontalRule", "Table", "Figure", "Div",
+}
+
+local levels = { Inlines = 2, Blocks = 4, Meta = 5, Pandoc = 6, Doc = 6 }
+for _, t in ipairs(inline_types) do
+  levels[t] = 1
+end
+for _, t in ipairs(block_types) do
+  levels[t] = 3
+end
+
+-- every filter pulls in util.lua (and some of them more) by path; only run each once
+local loaded_files = {}
+local function cached_dofile(path)
+  if loaded_files[path] == nil then
+    loaded_files[path] = table.pack(dofile(path))
+  end
+  return table.unpack(loaded_files[path], 1, loaded_files[path].n)
+end
+
+local profile_path = os.getenv("PAPER_FILTER_PROFILE_PATH")
+local profile = {}
+
+local function filter_name(path)
+  return (pandoc.path.split_extension(pandoc.path.filename(path)))
+end
+
+local function profiled(path, key, fn)
+  local entry = { name = filter_name(path), key = key, calls = 0, seconds = 0 }
+  table.insert(profile, entry)
+  return function(...)
+    -- CPU time, which is the closest thing to a clock the standard library has
+    local start = os.clock()
+    local results = table.pack(fn(...))
+    entry.seconds = entry.seconds + (os.clock() - start)
+    entry.calls = entry.calls + 1
+    return table.unpack(results, 1, results.n)
+  end
+end
+
+local function profile_passes(path, passes)
+  -- wrapping keeps the same keys, so the passes fuse exactly as they otherwise would
+  for _, pass in ipairs(passes) do
+    for k, v in pairs(pass) do
+      if levels[k] ~= nil and type(v) == "function" then
+        pass[k] = profiled(path, k, v)
+      end
+    end
+  end
+  return passes
+end
+
+local function write_profile(group)
+  return {
+    Pandoc = function(_)
+      local out_file = io.open(profile_path, "a")
+      for _, e in ipairs(profile) do
+        out_file:write(table.concat({ group, e.name, e.key, e.calls, string.format("%.6f", e.seconds) }, "\t"), "\n")
+      end
+      out_file:close()
+      return nil
+    end,
+  }
+end
+
+local function load_filter(path)
+  -- each script gets its own globals, same as when pandoc runs it directly
+  local env = setmetatable({ PANDOC_SCRIPT_FILE = path, dofile = cached_dofile }, { __index = _G })
+  local chunk = assert(loadfile(path, "t", env))
+  local result = chunk()
+  if result == nil then
+    -- no return value means the filter is whatever global functions it defined
+    local filter = {}
+    for k, v in pairs(env) do
+      if levels[k] ~= nil and type(v) == "function" then
+        filter[k] = v
+      end
+    end
+    return { filter }
+  end
+  if #result == 0 then
+    return { result }
+  end
+  return result
+end
+
+local function get_level_range(filter)
+  local low = math.huge
+  local high = -math.huge
+  for k, _ in pairs(filter) do
+    local level = levels[k]
+    if level == nil then
+      -- traversal settings or something unexpected; leave it alone
+      return nil, nil
+    end
+    low = math.min(low, level)
+    high = math.max(high, level)
+  end
+  return low, high
+end
+
+local function fuse_passes(passes)
+  local fused = {}
+  local current = nil
+  local current_high = nil
+  for _, pass in ipairs(passes) do
+    -- format-specific filters come out empty for other formats
+    if next(pass) ~= nil then
+      local low, high = get_level_range(pass)
+      if current ~= nil and current_high ~= nil and low ~= nil and current_high < low then
+        for k, v in pairs(pass) do
+          current[k] = v
+        end
+      else
+        current = {}
+        for k, v in pairs(pass) do
+          current[k] = v
+        end
+        table.insert(fused, current)
+      end
+      current_high = high
+    end
+  end
+  return fused
+end
+
+-- the list of scripts comes in through the environment, in order
+return function(env_var)
+  local paths = os.getenv(env_var)
+  if paths == nil or #paths == 0 then
+    return {}
+  end
+
+  local passes = {}
+  for _, path in ipairs(pandoc.path.split_search_path(paths)) do
+    local filter_passes
+    if profile_path == nil then
+      filter_passes = load_filter(path)
+    else
+      local start = os.clock()
+      filter_passes = profile_passes(path, load_filter(path))
+      table.insert(profile, { name = filter_name(path), key = "(load)", calls = 1, seconds = os.clock() - start })
+    end
+    for _, pass in ipairs(filter_passes) do
+      table.insert(passes, pass)
+    end
+  end
+
+  local fused = fuse_passes(passes)
+  if profile_path ~= nil then
+    -- on its own at the end, after everything it reports on has run
+    table.insert(fused, write_profile(env_var))
+  end
+  return fused
+end
@@ -0,0 +1,25 @@
+-- Writes the bibliography entries that are actually cited in the document
+--   out as CSL JSON, so the build can keep a record of them without running
+--   pandoc and citeproc a second time.
+-- Runs as the very last filter of the main build, after citeproc, so the
+--   Vulgate citation that filter-bible-ref adds is already in place.
+-- The output path comes from the environment rather than metadata, since
+--   docx would otherwise write it into the document's custom properties.
+
+function Pandoc(doc)
+  local out_path = os.getenv("PAPER_CITED_REFERENCES_PATH")
+  if out_path == nil then
+    return nil
+  end
+
+  -- only returns entries with a real citation (or nocite) in the document,
+  --    so the biblical pseudo-citations never show up
+  local refs = pandoc.utils.references(doc)
+  local ref_doc = pandoc.Pandoc({}, pandoc.Meta({ references = refs }))
+
+  local out_file = io.open(out_path, "w")
+  out_file:write(pandoc.write(ref_doc, "csljson"))
+  out_file:close()
+
+  return nil
+end
@@ -0,0 +1,3 @@
+-- Everything that runs after citeproc; see chain.lua
+
+return dofile(pandoc.path.join({ pandoc.path.directory(PANDOC_SCRIPT_FILE), "chain.lua" }))("PAPER_POST_FILTERS")
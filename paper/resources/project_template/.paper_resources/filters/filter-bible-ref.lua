@@ -93,26 +93,41 @@ local bible_books = {
   {"Wisdom", "Book of Wisdom", "Wis", nil, "Ws"}
 }
 
+-- lookups ignore case, periods, and extra spacing, so "1 Cor.", "1 cor", and
+--   "1  Cor" all land on the same entry
+local function normalize_alias(name)
+  return (name:lower():gsub("%.", ""):gsub("%s+", " "))
+end
+
+-- every accepted name points straight at its row, built once when the filter loads
+local book_index = {}
+for _, list in ipairs(bible_books) do
+  -- `pairs` rather than `ipairs`, since some rows have a gap where there's no second abbreviation
+  for _, bk in pairs(list) do
+    local key = normalize_alias(bk)
+    if book_index[key] == nil then
+      book_index[key] = list
+    end
+  end
+end
+
 function normalize_book_name(book, idx)
   if idx > 3 then
     print("[LUA FILTER WARNING] Cannot normalize a Bible book to an index greater than 3.")
     return nil
   end
 
-  for _, list in pairs(bible_books) do
-    for _, bk in pairs(list) do
-      if bk == book then
-        local suff = ""
-        if list[1] ~= list[3] then
-          suff = "."
-        end
-        return list[idx] .. suff
-      end
-    end
+  local list = book_index[normalize_alias(book)]
+  if list == nil then
+    print('[LUA FILTER WARNING] Could not normalize book name: "' .. book .. '"')
+    return nil
   end
 
-  print('[LUA FILTER WARNING] Could not normalize book name: "' .. book .. '"')
-  return nil
+  local suff = ""
+  if list[1] ~= list[3] then
+    suff = "."
+  end
+  return list[idx] .. suff
 end
 
 function process_bible_citation(suffix)
@@ -5,33 +5,23 @@ import subprocess
 from datetime import datetime
 
 import typer
-import matplotlib.dates as md
-import matplotlib.pyplot as plt
 
 from .util import ensure_paper_dir, get_metadata, get_assignment, stamp_local_dir
 from .wc import _wc_data, _wc_json, _wc_string
+from .cache import ensure_cache_dir
+from .progress_chart import render_progress_svg, lttb_downsample
 
 METADATA_START_SENTINEL = "<!-- begin paper metadata -->"
 METADATA_END_SENTINEL = "<!-- end paper metadata -->"
+PROGRESS_INDEX_NAME = "progress_index.jsonl"
+PROGRESS_CHART_MAX_POINTS = 400
 
 
-def _get_commit_data() -> list[dict[str, str | int | None]]:
-    log = (
-        subprocess.check_output(
-            [
-                "git",
-                "log",
-                "--format=%P|||%ct|||%B||-30-||",
-            ]
-        )
-        .decode("utf-8")
-        .strip()
-    )
-    commits_raw = [c.strip() for c in log.split("||-30-||") if len(c) > 0]
+def _parse_commit_log(log: str) -> list[dict[str, str | int | dict | None]]:
+    commits_raw = [c.strip() for c in log.strip().split("||-30-||") if len(c.strip()) > 0]
     commits = []
     for c in commits_raw:
         git_hash, timestamp, message = c.split("|||")
-        wc = None
         wc_splits = message.split("\nPAPER_DATA\n")
         if len(wc_splits) < 2:
             continue
@@ -39,36 +29,136 @@ def _get_commit_data() -> list[dict[str, str | int | None]]:
             wc_data = json.loads(wc_splits[1])
         except json.JSONDecodeError:
             continue
-        wc = wc_data["total"]
-        if len(git_hash) == 0:
-            git_hash = None
         commits.append(
             {
                 "hash": git_hash,
                 "timestamp": int(timestamp),
-                "message": message,
-                "word_count": wc,
+                "word_count": wc_data["total"],
+                "breakdown": wc_data.get("breakdown", {}),
             }
         )
+    # git log gives newest first
+    commits.reverse()
+    return commits
+
+
+def _git_commit_log(revision_range: str | None = None) -> str:
+    cmd = ["git", "log", "--format=%H|||%ct|||%B||-30-||"]
+    if revision_range != None:
+        cmd.append(revision_range)
+    return subprocess.check_output(cmd).decode("utf-8")
+
+
+def _read_progress_index(index_path: str) -> tuple[list[dict], str | None, bool]:
+    # only what's covered by the last marker can be trusted; anything after it
+    #   (a half-written line, or commits from a run that never finished) gets
+    #   dropped, and the third value says the file needs rewriting without it
+    commits = []
+    indexed_through = None
+    trusted_count = 0
+    clean = True
+    if not os.path.exists(index_path):
+        return commits, indexed_through, clean
+    with open(index_path, "r") as index_file:
+        for line in index_file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                clean = False
+                continue
+            if "indexed_through" in record:
+                indexed_through = record["indexed_through"]
+                trusted_count = len(commits)
+            else:
+                commits.append(record)
+    if trusted_count != len(commits):
+        clean = False
+    return commits[:trusted_count], indexed_through, clean
+
+
+def _get_commit_data() -> list[dict[str, str | int | dict | None]]:
+    # An append-only log of every commit that had word count data, oldest first,
+    #   with markers saying how far into the history it's been caught up. Only
+    #   the commits since the last marker need to go through `git log`.
+    index_path = os.path.join(ensure_cache_dir(), PROGRESS_INDEX_NAME)
+    commits, indexed_through, clean = _read_progress_index(index_path)
+
+    with open(os.devnull, "wb") as dev_null:
+        try:
+            head = subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=dev_null).decode("utf-8").strip()
+        except subprocess.CalledProcessError:
+            # no commits yet
+            return []
+        if head == indexed_through and clean:
+            return commits
+
+        # if history got rewritten (amend, rebase, etc.) the index can't be trusted anymore
+        is_ancestor = indexed_through != None and 0 == subprocess.call(
+            ["git", "merge-base", "--is-ancestor", indexed_through, head], stdout=dev_null, stderr=dev_null
+        )
+
+    if is_ancestor:
+        if head == indexed_through:
+            new_commits = []
+        else:
+            new_commits = _parse_commit_log(_git_commit_log(f"{indexed_through}..{head}"))
+    else:
+        commits = []
+        new_commits = _parse_commit_log(_git_commit_log(head))
+
+    # appending after a damaged tail would leave it there for good, so in that
+    #   case write out the trusted part again along with the new commits
+    if is_ancestor and clean:
+        mode = "a"
+        to_write = new_commits
+    else:
+        mode = "w"
+        to_write = commits + new_commits
+
+    with open(index_path, mode) as index_file:
+        for c in to_write:
+            index_file.write(f"{json.dumps(c)}\n")
+        index_file.write(f"{json.dumps({'indexed_through': head})}\n")
+
+    commits.extend(new_commits)
     return commits
 
 
 def _get_progress_image_str() -> str:
     commits = _get_commit_data()
-    commits.reverse()
-    dates = [datetime.fromtimestamp(c["timestamp"]) for c in commits]
-    dates.append(datetime.now())
-    dates = md.date2num(dates)
+    timestamps = [float(c["timestamp"]) for c in commits]
+    timestamps.append(datetime.now().timestamp())
     wcs = [c["word_count"] for c in commits]
     wcs = [c if isinstance(c, int) else 0 for c in wcs]
     wcs.append(sum(_wc_data().values()))
 
+    # years of saves don't need to be thousands of line segments
+    points = lttb_downsample(list(zip(timestamps, wcs)), PROGRESS_CHART_MAX_POINTS)
+    timestamps = [p[0] for p in points]
+    wcs = [p[1] for p in points]
+
     meta = get_metadata()
     due_date = meta["data"]["date"]
     if due_date:
-        due_date = md.date2num(due_date)
+        due_date = due_date.timestamp()
     goal_wc = meta.get("target_word_count", None)
 
+    if meta.get("progress_chart_backend", None) == "matplotlib":
+        try:
+            return _render_progress_matplotlib(timestamps, wcs, due_date, goal_wc)
+        except ImportError:
+            typer.echo("matplotlib isn't installed; using the built-in chart renderer.")
+    return render_progress_svg(timestamps, wcs, due_date, goal_wc)
+
+
+def _render_progress_matplotlib(timestamps: list[float], wcs: list[int], due_date: float | None, goal_wc: int | None):
+    import matplotlib.dates as md
+    import matplotlib.pyplot as plt
+
+    dates = md.date2num([datetime.fromtimestamp(t) for t in timestamps])
+    if due_date:
+        due_date = md.date2num(datetime.fromtimestamp(due_date))
+
     plt.rcParams["font.family"] = "sans-serif"
     fig, ax = plt.subplots()
     xfmt = md.DateFormatter("%h\n%d\n%Y")
@@ -135,7 +225,8 @@ def save(message: str = typer.Option(..., prompt="Commit message?")):
             readme.write(f"{METADATA_START_SENTINEL}\n")
             readme.write(f"{METADATA_END_SENTINEL}\n")
 
-    readme_text = open("./README.md", "r").read()
+    with open("./README.md", "r") as readme:
+        readme_text = readme.read()
     readme_before = readme_text[: readme_text.index(METADATA_START_SENTINEL)]
     readme_before = f"{readme_before}{METADATA_START_SENTINEL}\n"
     readme_after = readme_text[readme_text.index(METADATA_END_SENTINEL) + len(METADATA_END_SENTINEL) :]
@@ -153,6 +244,9 @@ def save(message: str = typer.Option(..., prompt="Commit message?")):
         subprocess.call(["git", "add", "."], stdout=dev_null)
         subprocess.call(["git", "commit", "-m", message], stdout=dev_null)
 
+    # get the new commit into the progress index while we know it's the only one
+    _get_commit_data()
+
 
 def web():
     ensure_paper_dir()
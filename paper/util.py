@@ -6,8 +6,8 @@ from pathlib import Path
 import typer
 import yaml
 
-from . import LIB_NAME, LIB_VERSION_STR
 from .shared import PAPER_STATE
+from .version_stamp import compute_version_stamp
 
 
 def merge_dictionary(target, new_dict):
@@ -47,10 +47,11 @@ def ensure_paper_dir():
 _meta = None
 
 
-def get_metadata() -> dict:
+def get_metadata(reload: bool = False) -> dict:
     global _meta
-    if _meta == None:
-        data = list(yaml.safe_load_all(open("./paper_meta.yml")))[0]
+    if _meta == None or reload:
+        with open("./paper_meta.yml") as meta_file:
+            data = list(yaml.safe_load_all(meta_file))[0]
         if "data" not in data:
             data["data"] = {}
         if "date" not in data["data"] or data["data"]["date"] == "[DATE]":
@@ -86,19 +87,20 @@ def get_date_string() -> str:
     return f"{target_date.strftime('%B %-d')}, {year_str}"
 
 
+_version_stamp = None
+
+
 def get_paper_version_stamp() -> str:
-    version = f"{LIB_NAME} v{LIB_VERSION_STR}"
-
-    wd = os.path.dirname(__file__)
-    is_git = 0 == subprocess.call(["git", "rev-parse"], cwd=wd)
-    if is_git:
-        git_rev = subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=wd).decode("utf-8").strip()
-        version = f"{version}\n{git_rev}"
-        diffs = subprocess.check_output(["git", "diff", "--stat"], cwd=wd).decode("utf-8").strip()
-        if len(diffs) != 0:
-            version = f"{version}+dev"
-
-    return version
+    global _version_stamp
+    if _version_stamp == None:
+        try:
+            # regular (non-editable) installs have this written out by setup.py
+            from ._build_stamp import VERSION_STAMP
+
+            _version_stamp = VERSION_STAMP
+        except ImportError:
+            _version_stamp = compute_version_stamp(os.path.dirname(__file__))
+    return _version_stamp
 
 
 def stamp_local_dir():
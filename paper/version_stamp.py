@@ -0,0 +1,21 @@
+# Kept free of third-party imports so setup.py can use it to bake the stamp in at install time.
+
+import os
+import subprocess
+
+from . import LIB_NAME, LIB_VERSION_STR
+
+
+def compute_version_stamp(wd: str) -> str:
+    version = f"{LIB_NAME} v{LIB_VERSION_STR}"
+
+    with open(os.devnull, "wb") as dev_null:
+        is_git = 0 == subprocess.call(["git", "rev-parse"], cwd=wd, stderr=dev_null)
+    if is_git:
+        git_rev = subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=wd).decode("utf-8").strip()
+        version = f"{version}\n{git_rev}"
+        diffs = subprocess.check_output(["git", "diff", "--stat"], cwd=wd).decode("utf-8").strip()
+        if len(diffs) != 0:
+            version = f"{version}+dev"
+
+    return version
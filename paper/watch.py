@@ -0,0 +1,272 @@
+import os
+import sys
+import glob
+import time
+import shutil
+import signal
+import struct
+import select
+import ctypes
+import ctypes.util
+import subprocess
+
+import typer
+
+from .util import ensure_paper_dir, get_metadata, get_bibliography_source_list
+from .shared import PAPER_STATE
+from .formats import Format, LATEX_AUX_DIRECTORY
+from .cache import CACHE_DIRECTORY
+
+# how long things have to be quiet before a burst of saves counts as finished
+WATCH_DEBOUNCE_SECONDS = 0.3
+POLL_INTERVAL_SECONDS = 0.25
+
+# fmt: off
+_IN_MODIFY      = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM  = 0x00000040
+_IN_MOVED_TO    = 0x00000080
+_IN_CREATE      = 0x00000100
+_IN_DELETE      = 0x00000200
+_IN_ISDIR       = 0x40000000
+_IN_NONBLOCK    = 0o4000
+_IN_CLOEXEC     = 0o2000000
+# fmt: on
+_IN_WATCH_MASK = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+_INOTIFY_EVENT_HEADER = struct.Struct("iIII")
+
+
+def _is_ignored_name(name: str) -> bool:
+    # editor swap/backup files come and go constantly while typing
+    return name.startswith(".") or name.endswith("~") or name.endswith(".swp")
+
+
+def _get_watch_targets() -> tuple[list[str], list[str]]:
+    trees = ["./content", "./.paper_resources"]
+    files = [os.path.abspath("./paper_meta.yml")]
+    files.extend(get_bibliography_source_list())
+    return trees, files
+
+
+class _InotifyWatcher:
+    def __init__(self, trees: list[str], files: list[str]):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        # watch descriptor -> (directory, set of file names we care about, or None for "all of them")
+        self._watches: dict[int, tuple[str, set[str] | None]] = {}
+        for t in trees:
+            for dirpath, _, _ in os.walk(t, followlinks=True):
+                self._watch_dir(dirpath, None)
+        for f in files:
+            # editors often save by writing a new file and renaming it over the old one,
+            #   so watch the directory rather than the file itself
+            self._watch_dir(os.path.dirname(f), {os.path.basename(f)})
+
+    def _watch_dir(self, path: str, names: set[str] | None):
+        wd = self._add_watch(self._fd, os.fsencode(path), _IN_WATCH_MASK)
+        if wd < 0:
+            return
+        if wd in self._watches:
+            existing_names = self._watches[wd][1]
+            if existing_names == None or names == None:
+                names = None
+            else:
+                names = existing_names | names
+        self._watches[wd] = (path, names)
+
+    def update_files(self, files: list[str]):
+        # only the list of single files changes; the watches themselves stay put,
+        #   so nothing saved in the meantime gets missed
+        wanted: dict[str, set[str]] = {}
+        for f in files:
+            wanted.setdefault(os.path.dirname(f), set()).add(os.path.basename(f))
+        for wd, (path, names) in list(self._watches.items()):
+            if names != None:
+                self._watches[wd] = (path, wanted.pop(path, set()))
+        for path, names in wanted.items():
+            self._watch_dir(path, names)
+
+    def wait(self, timeout: float) -> bool:
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if len(ready) == 0:
+            return False
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return False
+
+        changed = False
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, name_len = _INOTIFY_EVENT_HEADER.unpack_from(data, offset)
+            offset += _INOTIFY_EVENT_HEADER.size
+            name = os.fsdecode(data[offset : offset + name_len].rstrip(b"\0"))
+            offset += name_len
+            if wd not in self._watches:
+                continue
+            dirpath, names = self._watches[wd]
+            if _is_ignored_name(name):
+                continue
+            if names != None and name not in names:
+                continue
+            if mask & _IN_ISDIR and mask & (_IN_CREATE | _IN_MOVED_TO) and names == None:
+                # a moved-in directory can already have directories of its own
+                for new_dirpath, _, _ in os.walk(os.path.join(dirpath, name), followlinks=True):
+                    self._watch_dir(new_dirpath, None)
+            changed = True
+        return changed
+
+    def close(self):
+        os.close(self._fd)
+
+
+class _PollingWatcher:
+    def __init__(self, trees: list[str], files: list[str]):
+        self._trees = trees
+        self._files = files
+        self._snapshot = self._take_snapshot()
+
+    def _take_snapshot(self) -> dict[str, tuple[float, int]]:
+        paths = list(self._files)
+        for t in self._trees:
+            for dirpath, _, files in os.walk(t, followlinks=True):
+                paths.extend([os.path.join(dirpath, f) for f in files if not _is_ignored_name(f)])
+        snapshot = {}
+        for p in paths:
+            try:
+                stat = os.stat(p)
+            except FileNotFoundError:
+                continue
+            snapshot[p] = (stat.st_mtime, stat.st_size)
+        return snapshot
+
+    def wait(self, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        while True:
+            snapshot = self._take_snapshot()
+            if snapshot != self._snapshot:
+                self._snapshot = snapshot
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(POLL_INTERVAL_SECONDS, remaining))
+
+    def update_files(self, files: list[str]):
+        # start newly watched files from how they are now, rather than counting them as changed
+        for f in self._files:
+            if f not in files:
+                self._snapshot.pop(f, None)
+        for f in files:
+            if f not in self._files and os.path.exists(f):
+                stat = os.stat(f)
+                self._snapshot[f] = (stat.st_mtime, stat.st_size)
+        self._files = files
+
+    def close(self):
+        pass
+
+
+def _make_watcher():
+    trees, files = _get_watch_targets()
+    if sys.platform.startswith("linux"):
+        try:
+            return _InotifyWatcher(trees, files)
+        except (OSError, AttributeError):
+            pass
+    if PAPER_STATE["verbose"]:
+        typer.echo("No native file watching available; polling for changes instead.")
+    return _PollingWatcher(trees, files)
+
+
+def _start_build(output_formats: list[Format], docx_revision: int) -> subprocess.Popen:
+    # builds run as their own process (group) so they can be killed, pandoc
+    #   and LaTeX and all, when newer edits come in; everything incremental
+    #   lives on disk, so a fresh process still picks it all up
+    cmd = [sys.executable, "-m", "paper"]
+    if PAPER_STATE["verbose"]:
+        cmd.append("--verbose")
+    if PAPER_STATE.get("pandoc_server", False):
+        cmd.append("--pandoc-server")
+    cmd.append("build")
+    for f in output_formats:
+        cmd.extend(["--output-format", f.value])
+    cmd.extend(["--docx-revision", str(docx_revision)])
+    return subprocess.Popen(cmd, start_new_session=True)
+
+
+def _cancel_build(proc: subprocess.Popen):
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+        proc.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        os.killpg(proc.pid, signal.SIGKILL)
+        proc.wait()
+    except ProcessLookupError:
+        pass
+
+    # a killed build doesn't get to clean up after itself
+    leftovers = glob.glob(os.path.join("output", "title_page_*.md"))
+    leftovers.extend(glob.glob(os.path.join("output", "tmp*.docx")))
+    leftovers.extend(glob.glob(os.path.join(CACHE_DIRECTORY, "merged_*.json")))
+    leftovers.extend(glob.glob(os.path.join(CACHE_DIRECTORY, "**", "*.tmp"), recursive=True))
+    for f in leftovers:
+        try:
+            os.unlink(f)
+        except FileNotFoundError:
+            pass
+
+    # LaTeX might have been partway through writing its .aux/.toc files, which
+    #   would break the next run; it's only a slower first pass to start over
+    shutil.rmtree(LATEX_AUX_DIRECTORY, ignore_errors=True)
+
+
+def watch(output_formats: list[Format], docx_revision: int):
+    ensure_paper_dir()
+
+    watcher = _make_watcher()
+    typer.echo("Watching for changes... (Ctrl-C to stop)")
+
+    build_proc = _start_build(output_formats, docx_revision)
+    build_started = time.monotonic()
+    try:
+        while True:
+            if not watcher.wait(POLL_INTERVAL_SECONDS):
+                if build_proc != None and build_proc.poll() != None:
+                    elapsed = time.monotonic() - build_started
+                    if build_proc.returncode == 0:
+                        typer.echo(f"Build finished in {elapsed:.1f}s.")
+                    else:
+                        typer.echo(f"Build failed (exit code {build_proc.returncode}).")
+                    build_proc = None
+                continue
+
+            # let the burst of saves settle before doing anything
+            while watcher.wait(WATCH_DEBOUNCE_SECONDS):
+                pass
+
+            if build_proc != None and build_proc.poll() == None:
+                typer.echo("Changes detected; cancelling the running build...")
+                _cancel_build(build_proc)
+            else:
+                typer.echo("Changes detected; rebuilding...")
+
+            # the metadata might point at different bibliography sources now
+            get_metadata(reload=True)
+            watcher.update_files(_get_watch_targets()[1])
+
+            build_proc = _start_build(output_formats, docx_revision)
+            build_started = time.monotonic()
+
+    except KeyboardInterrupt:
+        if build_proc != None and build_proc.poll() == None:
+            _cancel_build(build_proc)
+        typer.echo()
+
+    finally:
+        watcher.close()
@@ -1,19 +1,58 @@
+import os
 import json
+from concurrent.futures import ProcessPoolExecutor
 
 import typer
 
 from .util import get_content_file_list, ensure_paper_dir
+from .cache import load_json_cache, save_json_cache
+
+WC_CACHE_NAME = "word_counts.json"
+# below this much uncounted text, starting up worker processes costs more than it saves
+PARALLEL_WC_MIN_BYTES = 4 * 1024 * 1024
+
+_wc_memo = None
+
+
+def _count_words(path: str) -> int:
+    with open(path, "r") as content_file:
+        contents = content_file.read().strip()
+    if contents.startswith("---\n"):
+        contents = contents.split("---\n")[2]
+    return len(contents.split())
 
 
 def _wc_data() -> dict[str, int]:
+    # gets asked for several times over the course of a single `save`
+    global _wc_memo
+    if _wc_memo != None:
+        return dict(_wc_memo)
+
+    cache = load_json_cache(WC_CACHE_NAME, {})
+    stats = {}
+    to_count = []
+    for cf in get_content_file_list():
+        stat = os.stat(cf)
+        stats[cf] = [stat.st_size, stat.st_mtime_ns]
+        if cf not in cache or cache[cf]["stat"] != stats[cf]:
+            to_count.append(cf)
+
+    counts = {}
+    if sum([stats[cf][0] for cf in to_count]) >= PARALLEL_WC_MIN_BYTES:
+        with ProcessPoolExecutor() as pool:
+            counts = dict(zip(to_count, pool.map(_count_words, to_count)))
+    else:
+        counts = {cf: _count_words(cf) for cf in to_count}
+
     wc_map = {}
-    content_files = get_content_file_list()
-    for cf in content_files:
-        contents = open(cf, "r").read().strip()
-        if contents.startswith("---\n"):
-            contents = contents.split("---\n")[2]
-        wc_map[cf] = len(contents.split())
-    return wc_map
+    for cf in stats:
+        wc_map[cf] = counts[cf] if cf in counts else cache[cf]["count"]
+
+    if len(to_count) > 0 or len(cache) != len(stats):
+        save_json_cache(WC_CACHE_NAME, {cf: {"stat": stats[cf], "count": wc_map[cf]} for cf in stats})
+
+    _wc_memo = wc_map
+    return dict(wc_map)
 
 
 def _wc_string() -> str:
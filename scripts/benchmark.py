@@ -0,0 +1,529 @@
+#!/usr/bin/env python3
+
+# times `paper` commands against a generated project of whatever size, plus
+#   copies of the example projects, and writes the results out as JSON so
+#   different versions can be compared:
+#
+#   python scripts/benchmark.py --chapters 20 --words 5000 --output before.json
+#   python scripts/benchmark.py --chapters 20 --words 5000 --compare before.json
+#
+# `--fake-tools` swaps in stand-ins for pandoc and xelatex that do next to
+#   nothing, leaving just the time spent in paper itself
+
+import os
+import sys
+import json
+import stat
+import time
+import zlib
+import random
+import shutil
+import struct
+import argparse
+import platform
+import resource
+import statistics
+import subprocess
+import tempfile
+from datetime import datetime, timezone
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+EXAMPLES_DIRECTORY = os.path.join(REPO_ROOT, "examples")
+
+sys.path.insert(0, REPO_ROOT)
+from paper.version_stamp import compute_version_stamp
+
+# docx+pdf needs Word on a Mac, so it's only in the list when asked for
+DEFAULT_FORMATS = ["docx", "latex", "latex+pdf", "json"]
+ALL_COMMANDS = ["build", "wc", "fmt", "save"]
+
+# fmt: off
+LOREM_WORDS = [
+    "lorem", "ipsum", "dolor", "sit", "amet", "consectetuer", "adipiscing", "elit", "aenean", "commodo",
+    "ligula", "eget", "massa", "cum", "sociis", "natoque", "penatibus", "et", "magnis", "dis", "parturient",
+    "montes", "nascetur", "ridiculus", "mus", "donec", "quam", "felis", "ultricies", "nec", "pellentesque",
+    "eu", "pretium", "quis", "sem", "nulla", "consequat", "enim", "pede", "justo", "fringilla", "vel",
+    "aliquet", "vulputate", "arcu", "in", "rhoncus", "ut", "imperdiet", "a", "venenatis", "vitae",
+    "dictum", "mollis", "integer", "tincidunt", "cras", "dapibus", "vivamus", "elementum", "semper",
+    "nisi", "eleifend", "tellus", "leo", "porttitor", "ac", "aliquam", "ante", "viverra", "feugiat",
+    "phasellus", "metus", "varius", "laoreet", "quisque", "rutrum", "etiam", "curabitur", "ullamcorper",
+]
+# fmt: on
+
+FAKE_PANDOC = r"""
+import os
+import re
+import sys
+import json
+import shutil
+
+# just enough of pandoc for paper to run end to end: markdown gets turned into
+#   a rough AST, and everything else gets copied through
+args = sys.argv[1:]
+if "--version" in args:
+    print("pandoc 0.0.0 (benchmark stand-in)")
+    sys.exit(0)
+if args[:1] == ["server"]:
+    sys.exit(1)
+
+VALUE_OPTIONS = [
+    "--from", "-f", "--to", "-t", "--output", "-o", "--metadata-file", "--resource-path", "--lua-filter",
+    "--csl", "--bibliography", "--reference-doc", "--template", "--variable", "-V", "--shift-heading-level-by",
+    "--wrap", "--columns", "--metadata", "-M",
+]
+opts = {}
+inputs = []
+i = 0
+while i < len(args):
+    if args[i] in VALUE_OPTIONS:
+        opts[args[i].lstrip("-")[:1] if len(args[i]) == 2 else args[i]] = args[i + 1]
+        i += 2
+    elif args[i].startswith("--") and "=" in args[i]:
+        k, v = args[i].split("=", 1)
+        opts[k] = v
+        i += 1
+    else:
+        if not args[i].startswith("-"):
+            inputs.append(args[i])
+        i += 1
+from_format = opts.get("--from", opts.get("f", "markdown"))
+to_format = opts.get("--to", opts.get("t", "markdown"))
+output = opts.get("--output", opts.get("o"))
+source = open(inputs[0], "r").read() if len(inputs) > 0 else sys.stdin.read()
+
+def inlines(text):
+    result = []
+    for m in re.finditer(r"\^\[[^\]]*\]|\[@[^\]]*\]|\S+", text):
+        token = m.group(0)
+        if len(result) > 0:
+            result.append({"t": "Space"})
+        if token.startswith("^["):
+            result.append({"t": "Note", "c": [{"t": "Para", "c": inlines(token[2:-1])}]})
+        elif token.startswith("[@"):
+            citations = []
+            for key in re.findall(r"@([\w:.#$%&+?<>~/-]+)", token):
+                citations.append({
+                    "citationId": key, "citationPrefix": [], "citationSuffix": [],
+                    "citationMode": {"t": "NormalCitation"}, "citationNoteNum": 0, "citationHash": 0,
+                })
+            result.append({"t": "Cite", "c": [citations, [{"t": "Str", "c": token}]]})
+        else:
+            result.append({"t": "Str", "c": token})
+    return result
+
+def parse(text):
+    if text.startswith("---\n"):
+        text = text.split("---\n", 2)[-1]
+    blocks = []
+    for para in re.split(r"\n\s*\n", text):
+        para = para.strip()
+        if len(para) == 0:
+            continue
+        heading = re.match(r"^(#+)\s+(.*)$", para)
+        if heading != None:
+            blocks.append({"t": "Header", "c": [len(heading.group(1)), ["", [], []], inlines(heading.group(2))]})
+        else:
+            blocks.append({"t": "Para", "c": inlines(para)})
+    return {"pandoc-api-version": [1, 23, 1], "meta": {}, "blocks": blocks}
+
+if "--citeproc" in args and "PAPER_CITED_REFERENCES_PATH" in os.environ:
+    open(os.environ["PAPER_CITED_REFERENCES_PATH"], "w").write("[]")
+
+if to_format == "json":
+    result = source if from_format == "json" else json.dumps(parse(source))
+elif to_format == "csljson":
+    result = source if from_format == "csljson" else "[]"
+else:
+    result = source
+
+if output == None:
+    sys.stdout.write(result)
+elif to_format == "docx":
+    shutil.copy(opts["--reference-doc"], output)
+else:
+    open(output, "w").write(result)
+"""
+
+FAKE_XELATEX = r"""
+import os
+import sys
+
+# writes the files a run would, and settles the aux file on the second run
+args = sys.argv[1:]
+if "--version" in args:
+    print("XeTeX 0.0 (benchmark stand-in)")
+    sys.exit(0)
+out_dir = args[args.index("--output-directory") + 1] if "--output-directory" in args else "."
+job = args[args.index("--jobname") + 1] if "--jobname" in args else os.path.splitext(os.path.basename(args[-1]))[0]
+if "-ini" in args:
+    open(os.path.join(out_dir, job + ".fmt"), "w").write("")
+    open(os.path.join(out_dir, job + ".log"), "w").write("")
+    sys.exit(0)
+aux_path = os.path.join(out_dir, job + ".aux")
+runs = int(open(aux_path).read()) if os.path.exists(aux_path) else 0
+open(aux_path, "w").write(str(min(runs + 1, 2)))
+open(os.path.join(out_dir, job + ".pdf"), "w").write("")
+open(os.path.join(out_dir, job + ".log"), "w").write("")
+"""
+
+
+def _write_tool(bin_dir: str, name: str, source: str):
+    tool_path = os.path.join(bin_dir, name)
+    with open(tool_path, "w") as tool_file:
+        tool_file.write(f"#!{sys.executable}\n{source}")
+    os.chmod(tool_path, os.stat(tool_path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+
+def _make_png(width: int, height: int, rng: random.Random) -> bytes:
+    # a flat gray image; enough to make pandoc and LaTeX go find it and embed it
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    shade = rng.randrange(64, 224)
+    rows = b"".join([b"\x00" + bytes([shade]) * width for _ in range(height)])
+    header = struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(rows)) + chunk(b"IEND", b"")
+
+
+def _words(rng: random.Random, count: int) -> list[str]:
+    return [rng.choice(LOREM_WORDS) for _ in range(count)]
+
+
+def _spread(total: int, buckets: int, rng: random.Random) -> list[int]:
+    # which bucket each of `total` things lands in
+    return sorted([rng.randrange(buckets) for _ in range(total)])
+
+
+def _write_bibliography(project_dir: str, entries: int, bib_format: str, rng: random.Random) -> str:
+    research_dir = os.path.join(project_dir, "research")
+    os.makedirs(research_dir, exist_ok=True)
+    records = []
+    for n in range(entries):
+        family, given = [w.capitalize() for w in _words(rng, 2)]
+        records.append(
+            {
+                "id": f"bench{n}",
+                "type": "book",
+                "title": " ".join(_words(rng, rng.randrange(3, 9))).capitalize(),
+                "author": [{"family": family, "given": given}],
+                "issued": {"date-parts": [[rng.randrange(1850, 2024)]]},
+                "publisher": f"{' '.join(_words(rng, 2)).title()} Press",
+                "publisher-place": "New York",
+            }
+        )
+
+    if bib_format == "json":
+        bib_path = os.path.join(research_dir, "bibliography.json")
+        with open(bib_path, "w") as bib_file:
+            json.dump(records, bib_file, indent=2)
+    else:
+        bib_path = os.path.join(research_dir, "bibliography.bib")
+        with open(bib_path, "w") as bib_file:
+            for r in records:
+                author = f"{r['author'][0]['family']}, {r['author'][0]['given']}"
+                bib_file.write(f"@book{{{r['id']},\n")
+                bib_file.write(f"  author = {{{author}}},\n")
+                bib_file.write(f"  title = {{{r['title']}}},\n")
+                bib_file.write(f"  date = {{{r['issued']['date-parts'][0][0]}}},\n")
+                bib_file.write(f"  publisher = {{{r['publisher']}}},\n")
+                bib_file.write(f"  location = {{{r['publisher-place']}}},\n")
+                bib_file.write("}\n\n")
+    return bib_path
+
+
+def _write_chapter(
+    chapter_path: str, number: int, words: int, footnotes: int, citations: int, images: list[str], bib_entries: int
+):
+    rng = random.Random(number)
+    paragraph_count = max(words // 120, 1)
+    paragraphs = [_words(rng, max(words // paragraph_count, 1)) for _ in range(paragraph_count)]
+
+    # footnotes and citations go after a word somewhere in their paragraph
+    for p in _spread(footnotes, paragraph_count, rng):
+        pos = rng.randrange(len(paragraphs[p]))
+        paragraphs[p][pos] += f"^[{' '.join(_words(rng, rng.randrange(8, 30)))}.]"
+    if bib_entries > 0:
+        for p in _spread(citations, paragraph_count, rng):
+            pos = rng.randrange(len(paragraphs[p]))
+            paragraphs[p][pos] += f" [@bench{rng.randrange(bib_entries)}, {rng.randrange(1, 400)}]"
+
+    with open(chapter_path, "w") as chapter:
+        chapter.write(f"# Chapter {number + 1}\n\n")
+        for i, words_list in enumerate(paragraphs):
+            if i > 0 and i % 6 == 0:
+                chapter.write(f"## {' '.join(_words(rng, 3)).title()}\n\n")
+            chapter.write(f"{' '.join(words_list).capitalize()}.\n\n")
+        for image in images:
+            chapter.write(f"![{' '.join(_words(rng, 4)).capitalize()}](images/{image})\n\n")
+
+
+def _git_commit_all(project_dir: str, message: str, env: dict):
+    subprocess.check_call(["git", "add", "-A"], cwd=project_dir, env=env, stdout=subprocess.DEVNULL)
+    subprocess.call(["git", "commit", "-q", "-m", message], cwd=project_dir, env=env, stdout=subprocess.DEVNULL)
+
+
+def generate_project(work_dir: str, options: argparse.Namespace, env: dict) -> str:
+    subprocess.run(_paper_command(["new", "synthetic"]), cwd=work_dir, env=env, capture_output=True, check=True)
+    project_dir = os.path.join(work_dir, "synthetic")
+    rng = random.Random(options.seed)
+
+    content_dir = os.path.join(project_dir, "content")
+    for f in os.listdir(content_dir):
+        os.unlink(os.path.join(content_dir, f))
+    images_dir = os.path.join(content_dir, "images")
+    os.makedirs(images_dir)
+    image_names = [f"figure_{n + 1}.png" for n in range(options.images)]
+    for name in image_names:
+        with open(os.path.join(images_dir, name), "wb") as image_file:
+            image_file.write(_make_png(320, 240, rng))
+
+    image_chapters = _spread(options.images, options.chapters, rng)
+    footnote_chapters = _spread(options.footnotes, options.chapters, rng)
+    citation_chapters = _spread(options.citations, options.chapters, rng)
+    for n in range(options.chapters):
+        _write_chapter(
+            os.path.join(content_dir, f"{n:02d}_chapter.md"),
+            n,
+            options.words // options.chapters,
+            footnote_chapters.count(n),
+            citation_chapters.count(n),
+            [image_names[i] for i, c in enumerate(image_chapters) if c == n],
+            options.bib_entries,
+        )
+
+    sources = []
+    if options.bib_entries > 0:
+        bib_path = _write_bibliography(project_dir, options.bib_entries, options.bib_format, rng)
+        sources.append(f"./{os.path.relpath(bib_path, project_dir)}")
+    with open(os.path.join(project_dir, "paper_meta.yml"), "w") as meta_file:
+        meta_file.write("---\n")
+        meta_file.write("data:\n")
+        meta_file.write("  date: '2063-04-05'\n")
+        meta_file.write("  author: 'Zefram Cochrane'\n")
+        meta_file.write("  title: 'Synthetic Benchmark Paper'\n")
+        meta_file.write("  class_mnemonic: 'BENCH 1000'\n")
+        meta_file.write("  class_name: 'Benchmarking'\n")
+        meta_file.write("  professor: 'Professor Richard Daystrom'\n")
+        meta_file.write(f"target_word_count: {options.words}\n")
+        meta_file.write("use_ibid: false\n")
+        meta_file.write(f"sources: {json.dumps(sources)}\n")
+        meta_file.write("---\n")
+
+    _git_commit_all(project_dir, "Generate benchmark content", env)
+    return project_dir
+
+
+def copy_examples(work_dir: str, env: dict) -> list[str]:
+    # the examples point at their shared bibliography by relative path, so they get copied as a set
+    examples_dir = os.path.join(work_dir, "examples")
+    shutil.copytree(EXAMPLES_DIRECTORY, examples_dir)
+    project_dirs = []
+    for d in sorted(os.listdir(examples_dir)):
+        project_dir = os.path.join(examples_dir, d)
+        if not os.path.exists(os.path.join(project_dir, "paper_meta.yml")):
+            continue
+        shutil.rmtree(os.path.join(project_dir, "output"), ignore_errors=True)
+        subprocess.run(["git", "init"], cwd=project_dir, env=env, capture_output=True, check=True)
+        _git_commit_all(project_dir, "Copy example", env)
+        project_dirs.append(project_dir)
+    return project_dirs
+
+
+def _paper_command(args: list[str]) -> list[str]:
+    return [sys.executable, "-m", "paper"] + args
+
+
+def _get_commands(options: argparse.Namespace) -> list[tuple[str, list[str]]]:
+    commands = []
+    for c in options.commands:
+        if c == "build":
+            for f in options.formats:
+                commands.append((f"build {f}", ["build", "--force", "--output-format", f]))
+        elif c == "fmt":
+            commands.append(("fmt", ["fmt"]))
+        elif c == "wc":
+            commands.append(("wc", ["wc"]))
+        elif c == "save":
+            commands.append(("save", ["save", "--message", "Benchmark save"]))
+    return commands
+
+
+def _clear_caches(project_dir: str, user_cache_dir: str):
+    shutil.rmtree(os.path.join(project_dir, ".paper_data", "cache"), ignore_errors=True)
+    shutil.rmtree(user_cache_dir, ignore_errors=True)
+    os.makedirs(user_cache_dir)
+
+
+def _touch_content(project_dir: str, run: int):
+    # `save` with nothing to commit isn't what anybody's waiting on
+    content_dir = os.path.join(project_dir, "content")
+    last_file = sorted([f for f in os.listdir(content_dir) if f.endswith(".md")])[-1]
+    with open(os.path.join(content_dir, last_file), "a") as content_file:
+        content_file.write(f"\nBenchmark edit number {run + 1}.\n")
+
+
+def time_command(args: list[str], project_dir: str, env: dict, timeout: int) -> dict:
+    usage_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start = time.perf_counter()
+    try:
+        proc = subprocess.run(_paper_command(args), cwd=project_dir, env=env, capture_output=True, timeout=timeout)
+        ok = proc.returncode == 0
+        error = None if ok else proc.stderr.decode("utf-8", errors="replace").strip().splitlines()[-5:]
+    except subprocess.TimeoutExpired:
+        ok = False
+        error = [f"timed out after {timeout} seconds"]
+    wall = time.perf_counter() - start
+    usage_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = (usage_after.ru_utime - usage_before.ru_utime) + (usage_after.ru_stime - usage_before.ru_stime)
+    run = {"ok": ok, "wall": round(wall, 4), "cpu": round(cpu, 4)}
+    if error != None:
+        run["error"] = error
+    return run
+
+
+def benchmark_project(name: str, project_dir: str, options: argparse.Namespace, env: dict) -> list[dict]:
+    results = []
+    for label, args in _get_commands(options):
+        # first run starts from empty caches; the rest show the usual, warmed-up case
+        _clear_caches(project_dir, env["XDG_CACHE_HOME"])
+        runs = []
+        for run in range(options.repeat):
+            if args[0] == "save":
+                _touch_content(project_dir, run)
+            runs.append(time_command(args, project_dir, env, options.timeout))
+            if not runs[-1]["ok"]:
+                break
+        result = {"project": name, "command": label, "runs": runs, "ok": all([r["ok"] for r in runs])}
+        if result["ok"]:
+            result["cold_wall"] = runs[0]["wall"]
+            warm = [r["wall"] for r in runs[1:]]
+            result["warm_wall"] = round(statistics.median(warm), 4) if len(warm) > 0 else None
+        results.append(result)
+        _report_result(result)
+    return results
+
+
+def _report_result(result: dict):
+    if not result["ok"]:
+        print(f"  {result['command']:<20} FAILED")
+        for line in result["runs"][-1]["error"]:
+            print(f"    {line}")
+        return
+    warm = "" if result["warm_wall"] == None else f"  warm {result['warm_wall']:8.3f}s"
+    print(f"  {result['command']:<20} cold {result['cold_wall']:8.3f}s{warm}")
+
+
+def _get_tool_version(tool: str, env: dict) -> str | None:
+    try:
+        output = subprocess.check_output([tool, "--version"], env=env, stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.decode("utf-8", errors="replace").splitlines()[0].strip()
+
+
+def compare_results(previous_path: str, results: list[dict]):
+    with open(previous_path, "r") as previous_file:
+        previous = json.load(previous_file)
+    previous_results = {(r["project"], r["command"]): r for r in previous["results"]}
+    print()
+    print(f"Compared to {previous_path} ({previous['paper_version'].splitlines()[-1]}):")
+    for r in results:
+        p = previous_results.get((r["project"], r["command"]))
+        if p == None or not p["ok"] or not r["ok"]:
+            continue
+        for key in ["cold_wall", "warm_wall"]:
+            if r.get(key) == None or p.get(key) == None or p[key] == 0:
+                continue
+            change = (r[key] - p[key]) / p[key] * 100
+            print(
+                f"  {r['project']:<20} {r['command']:<20} {key.split('_')[0]:<5} {p[key]:8.3f}s -> {r[key]:8.3f}s ({change:+.1f}%)"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time paper commands on generated and example projects.")
+    parser.add_argument("--chapters", type=int, default=10, help="content files in the generated project")
+    parser.add_argument("--words", type=int, default=20000, help="words in the generated project, all told")
+    parser.add_argument("--footnotes", type=int, default=200, help="footnotes in the generated project")
+    parser.add_argument("--citations", type=int, default=200, help="citations in the generated project")
+    parser.add_argument("--images", type=int, default=5, help="images in the generated project")
+    parser.add_argument("--bib-entries", type=int, default=500, help="entries in the generated bibliography")
+    parser.add_argument("--bib-format", choices=["json", "bib"], default="bib")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--formats", nargs="+", default=DEFAULT_FORMATS, metavar="FORMAT")
+    parser.add_argument("--commands", nargs="+", choices=ALL_COMMANDS, default=ALL_COMMANDS)
+    parser.add_argument("--repeat", type=int, default=3, help="runs of each command (the first one cold)")
+    parser.add_argument("--timeout", type=int, default=900, help="seconds before giving up on a run")
+    parser.add_argument("--no-synthetic", action="store_true", help="skip the generated project")
+    parser.add_argument("--no-examples", action="store_true", help="skip the example projects")
+    parser.add_argument("--fake-tools", action="store_true", help="use stand-ins for pandoc and xelatex")
+    parser.add_argument("--output", help="where to write the JSON results")
+    parser.add_argument("--compare", help="earlier results to compare against")
+    parser.add_argument("--keep", action="store_true", help="leave the benchmark projects on disk")
+    options = parser.parse_args()
+    options.repeat = max(options.repeat, 1)
+    options.chapters = max(options.chapters, 1)
+
+    work_dir = tempfile.mkdtemp(prefix="paper-benchmark-")
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([REPO_ROOT] + [p for p in [env.get("PYTHONPATH")] if p])
+    # a user cache of its own, so cold runs really are cold and nothing real gets pruned
+    env["XDG_CACHE_HOME"] = os.path.join(work_dir, "user_cache")
+    # `new` and `save` both commit
+    env.setdefault("GIT_AUTHOR_NAME", "Paper Benchmark")
+    env.setdefault("GIT_AUTHOR_EMAIL", "benchmark@example.com")
+    env.setdefault("GIT_COMMITTER_NAME", env["GIT_AUTHOR_NAME"])
+    env.setdefault("GIT_COMMITTER_EMAIL", env["GIT_AUTHOR_EMAIL"])
+    if options.fake_tools:
+        bin_dir = os.path.join(work_dir, "bin")
+        os.makedirs(bin_dir)
+        _write_tool(bin_dir, "pandoc", FAKE_PANDOC)
+        _write_tool(bin_dir, "xelatex", FAKE_XELATEX)
+        env["PATH"] = os.pathsep.join([bin_dir, env.get("PATH", "")])
+
+    report = {
+        "paper_version": compute_version_stamp(REPO_ROOT),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "fake_tools": options.fake_tools,
+        "tools": {t: _get_tool_version(t, env) for t in ["pandoc", "xelatex"]},
+        "options": {k: v for k, v in vars(options).items() if k not in ["output", "compare", "keep"]},
+        "results": [],
+    }
+
+    try:
+        projects = []
+        if not options.no_synthetic:
+            print("Generating synthetic project...")
+            projects.append(("synthetic", generate_project(work_dir, options, env)))
+        if not options.no_examples:
+            projects.extend([(f"examples/{os.path.basename(p)}", p) for p in copy_examples(work_dir, env)])
+
+        for name, project_dir in projects:
+            print(f"{name}:")
+            report["results"].extend(benchmark_project(name, project_dir, options, env))
+    finally:
+        if options.keep:
+            print(f"Benchmark projects left in {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    output_path = options.output
+    if output_path == None:
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        output_path = f"benchmark-{stamp}.json"
+    with open(output_path, "w") as output_file:
+        json.dump(report, output_file, indent=2)
+    print(f"Results written to {output_path}")
+
+    if options.compare != None:
+        compare_results(options.compare, report["results"])
+
+    if not all([r["ok"] for r in report["results"]]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -14,8 +14,8 @@ pushd ../paper/resources/project_template/.paper_resources/filters > /dev/null
   stylua --indent-type=Spaces --indent-width=2 ./*
 popd > /dev/null
 
-pushd ../paper/resources/writers > /dev/null
-  echo "Auto-formatting Lua writers..."
+pushd ../paper/resources/filters > /dev/null
+  echo "Auto-formatting internal Lua filters..."
   stylua --indent-type=Spaces --indent-width=2 ./*
 popd > /dev/null
 
@@ -1,7 +1,22 @@
 import os
 from setuptools import setup, find_packages
+from setuptools.command.build_py import build_py
 
 from paper import LIB_VERSION_STR, LIB_NAME
+from paper.version_stamp import compute_version_stamp
+
+
+class build_py_with_stamp(build_py):
+    # bake the version stamp into regular installs so `paper` doesn't have to
+    #   shell out to git for it at runtime; editable installs keep asking git,
+    #   since the code can change underneath them
+    def run(self):
+        super().run()
+        if getattr(self, "editable_mode", False):
+            return
+        stamp = compute_version_stamp(os.path.abspath(os.path.dirname(__file__)))
+        with open(os.path.join(self.build_lib, "paper", "_build_stamp.py"), "w") as stamp_file:
+            stamp_file.write(f"VERSION_STAMP = {stamp!r}\n")
 
 with open(os.path.join(os.path.abspath(os.path.dirname(__file__)), 'README.md'), encoding="utf-8", mode="r") as f:
     LONGDESC = f.read()
@@ -37,10 +52,14 @@ setup(
     install_requires=[
         'typer',
         'pyyaml',
-        'python-docx',
         'PyPDF2',
-        'matplotlib',
     ],
+    extras_require={
+        'matplotlib': ['matplotlib'],
+    },
+    cmdclass={
+        'build_py': build_py_with_stamp,
+    },
     entry_points={
         'console_scripts': [
             'paper = paper.cli:main'